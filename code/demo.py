@@ -14,7 +14,7 @@ HiVeGen pipeline (step-by-step scaffold)
 - LLM configuration step: placeholder (falls back to heuristic config JSON)
 """
 
-import os, re, json, time, requests
+import os, re, json, time
 from typing import Dict, Any, Optional, Tuple, List
 import shlex
 import subprocess
@@ -22,15 +22,31 @@ import datetime as dt
 from pathlib import Path
 import logging
 import sys
+import threading
 from helper.runtime_parser import runtime_parser_preview, runtime_parser_commit, _parse_sv_header
-from helper.code_retriever import get_embedding, ensure_collection,  QDRANT_COLLECTION, search_candidates, retrieve_or_llm_generate, reinforce_after_validation, update_weight, upsert_code_block, fallback_llm_func
-from helper.module_generator import module_generator_llm, build_module_context
+from helper.code_retriever import get_embedding, ensure_collection,  QDRANT_COLLECTION, search_candidates, retrieve_or_llm_generate, retrieve_candidates_batch, reinforce_after_validation, update_weight, upsert_code_block, fallback_llm_func
+from helper.module_generator import module_generator_llm, build_module_context, generation_timings, speculative_module_generation, SPECULATIVE_N
 from helper.ppa_eval import evaluate_ppa_from_config
+from helper.llm_client import chat_completion, timing_summary
+from helper.response_cache import cache_stats
+from helper.embedding_cache import emb_cache_stats
+from helper.dag_scheduler import run_module_dag, postorder_modules, MAX_PARALLEL_MODULES
+from helper.token_budget import usage_report
+from helper.rate_limiter import rate_limiter_stats
+from helper.code_retriever import qdrant_round_trip_stats, flush_weight_updates, weight_journal_stats
+from helper.gc_sweeper import start_gc_sweeper, stop_gc_sweeper
+from helper.interface_fingerprint import interface_fingerprint
+from helper.validation_service import submit_validation, stop_validation_service
+from helper.validation_cache import vcache_stats
+from helper.sv_prelint import check_candidate, prelint_stats, PRELINT_ENABLED
 import shutil, subprocess, tempfile, os, textwrap
 
 import dotenv
 dotenv.load_dotenv()
 
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")  # e.g. the local stand-in (helper/openai_standin.py)
+INCREMENTAL_VALIDATION = os.getenv("HIVEGEN_INCREMENTAL_VALIDATION", "1") not in ("0", "false", "False")  # candidate + child stubs; full bundle once at assembly
+
 
 # ---------- folders (relative to this file) ----------
 CUR_DIR   = Path(__file__).resolve().parent
@@ -200,7 +216,7 @@ def generate_configuration_via_openai(
     *,
     output_path: Path | None = None,
     model: str = "gpt-5-chat-latest",
-    base_url: str = "https://api.openai.com/v1",
+    base_url: str = OPENAI_BASE_URL,
     timeout_secs: int = 60,
     max_retries: int = 3,
 ) -> Path:
@@ -242,7 +258,6 @@ def generate_configuration_via_openai(
 
     # ---- HTTP request ----
     url = f"{base_url.rstrip('/')}/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": model,
         "messages": [
@@ -259,9 +274,8 @@ def generate_configuration_via_openai(
     last_err = None
     for attempt in range(1, max_retries + 1):
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout_secs)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
+            resp_json = chat_completion(url, payload, api_key=api_key, timeout=timeout_secs, stage="config_generator")
+            content = resp_json["choices"][0]["message"]["content"]
             data = extract_first_json_block(content)
             # ---- write output ----
             out_path = (
@@ -289,7 +303,7 @@ def prompt_enhancer(
     dfg_path: Optional[Path] = None,
     *,
     model: str = "gpt-5-chat-latest",
-    base_url: str = "https://api.openai.com/v1",
+    base_url: str = OPENAI_BASE_URL,
     timeout_secs: int = 60,
     max_retries: int = 3,
 ) -> Path:
@@ -351,7 +365,6 @@ def prompt_enhancer(
       
     # --- call OpenAI Chat Completions (HTTP) ---
     url = f"{base_url.rstrip('/')}/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": model,
         "messages": [
@@ -365,9 +378,8 @@ def prompt_enhancer(
     last_err = None
     for attempt in range(1, max_retries + 1):
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout_secs)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"].strip()
+            resp_json = chat_completion(url, payload, api_key=api_key, timeout=timeout_secs, stage="prompt_enhancer")
+            content = resp_json["choices"][0]["message"]["content"].strip()
             Path(output_path).write_text(content)
             if "logging" in globals():
                 logging.info("Wrote augmented prompt -> %s", output_path)
@@ -429,7 +441,7 @@ def llm_task_manager_code_sketch(
     *,
     out_dir: Optional = None,
     model: str = "gpt-5-chat-latest",
-    base_url: str = "https://api.openai.com/v1",
+    base_url: str = OPENAI_BASE_URL,
     timeout_secs: int = 60,
     max_retries: int = 3,
 ) -> Tuple[Path, Path, Dict[str, Path]]:
@@ -493,7 +505,6 @@ def llm_task_manager_code_sketch(
 
     # --- call OpenAI with retries ---
     url = f"{base_url.rstrip('/')}/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
         "model": model,
         "messages": [
@@ -513,9 +524,8 @@ def llm_task_manager_code_sketch(
     last_err = None
     for attempt in range(1, max_retries + 1):
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout_secs)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
+            resp_json = chat_completion(url, payload, api_key=api_key, timeout=timeout_secs, stage="task_manager")
+            content = resp_json["choices"][0]["message"]["content"]
             data = _extract_json_block(content)
 
             # --- basic validation ---
@@ -602,19 +612,8 @@ def has_iverilog() -> bool:
     return shutil.which("iverilog") is not None
 
 def compile_sv_syntax_only(code_text: str) -> tuple[bool, str]:
-    """Write code to temp file and try to compile with iverilog (syntax only)."""
-    if not has_iverilog():
-        return True, "iverilog not found; skipping syntax check (treat as PASS)"
-    with tempfile.TemporaryDirectory() as td:
-        sv = os.path.join(td, "unit.sv")
-        with open(sv, "w") as f:
-            f.write(textwrap.dedent(code_text))
-        # -g2012: SystemVerilog; -tnull: compile only
-        cmd = ["iverilog", "-g2012", "-tnull", sv]
-        proc = subprocess.run(cmd, capture_output=True, text=True)
-        ok = proc.returncode == 0
-        msg = (proc.stdout or "") + (proc.stderr or "")
-        return ok, msg
+    """Syntax-check one unit with iverilog (runs on the validation service's worker pool)."""
+    return submit_validation({"unit": code_text}, kind="unit").result()
 
 def interface_from_sketch(sketch_path: Path) -> list[str]:
     text = sketch_path.read_text()
@@ -627,49 +626,35 @@ def load_hierarchy(idx_path: Path):
     mods: Dict[str, Dict] = idx["modules"]
     return top, mods
 
-def postorder_modules(top: str, mods: Dict[str, Dict]) -> List[str]:
-    """Return modules in leaves→parents order (post-order DFS)."""
-    order, seen = [], set()
-
-    def dfs(n: str):
-        if n in seen: return
-        seen.add(n)
-        for ch in mods.get(n, {}).get("children", []):
-            dfs(ch)
-        order.append(n)
-
-    dfs(top)
-    return order  # leaves first, top last
-
 def has_iverilog() -> bool:
     return shutil.which("iverilog") is not None
 
 def compile_bundle_syntax_only(named_sources: Dict[str, str]) -> tuple[bool, str]:
     """
     named_sources: {module_name: code_text}
-    Compile all together so parent instantiations resolve.
+    Compile all together so parent instantiations resolve (on the validation service;
+    use submit_validation() directly to get a Future instead of waiting).
     """
-    if not has_iverilog():
-        return True, "iverilog not found; treating as PASS"
-
-    with tempfile.TemporaryDirectory() as td:
-        paths = []
-        for i, (mn, code) in enumerate(named_sources.items()):
-            p = Path(td) / f"{i:03d}_{mn}.sv"
-            p.write_text(textwrap.dedent(code))
-            paths.append(str(p))
-        # -g2012: SystemVerilog; -tnull: syntax only
-        proc = subprocess.run(["iverilog", "-g2012", "-tnull", *paths],
-                              capture_output=True, text=True)
-        ok = (proc.returncode == 0)
-        msg = (proc.stdout or "") + (proc.stderr or "")
-        return ok, msg
-    
+    return submit_validation(named_sources).result()
+
 # Build child headers dict for this module
 def sv_header_from_code(code: str) -> str:
     m = re.search(r'(?is)^\s*module\s+[A-Za-z_]\w*\s*(?:#\s*\(.*?\))?\s*\(.*?\)\s*;', code)
     return m.group(0) if m else ""
 
+def validation_sources(mname: str, candidate: str, child_sources: Dict[str, str]) -> Dict[str, str]:
+    """
+    What one attempt compiles: the candidate plus header-only stubs of its direct children
+    (ports resolve, their bodies are not recompiled). A child whose header can't be cut out
+    goes in as full source.
+    """
+    srcs = {}
+    for ch, ch_code in child_sources.items():
+        hdr = sv_header_from_code(ch_code)
+        srcs[ch] = f"{hdr}\nendmodule\n" if hdr else ch_code
+    srcs[mname] = candidate
+    return srcs
+
 
 def evaluate_ppa(design_path: Path, ppa_goal: dict) -> dict:
     """
@@ -701,6 +686,7 @@ def evaluate_ppa(design_path: Path, ppa_goal: dict) -> dict:
 # ---------- main ----------
 def main():
     log_path = init_logging()
+    start_gc_sweeper()  # background: removes GC-flagged points, enforces HIVEGEN_LIBRARY_MAX_POINTS
     logging.info("Working dir: %s", CUR_DIR)
 
     user_prompt, cfg_tmpl_path, app_path = get_inputs()
@@ -724,7 +710,7 @@ def main():
         sys_prompt_path,
         output_path=DIR_OUT / "configuration.json",   # optional; can omit to use default
         model="gpt-5-chat-latest",
-        base_url="https://api.openai.com/v1",
+        base_url=OPENAI_BASE_URL,
         timeout_secs=60,
         max_retries=3,
     )
@@ -737,7 +723,7 @@ def main():
         output_path=aug_path,                 # where to save the augmented prompt
         dfg_path=dfg_json,                    # optional; include if you have DFG
         model="gpt-5-chat-latest",
-        base_url="https://api.openai.com/v1",
+        base_url=OPENAI_BASE_URL,
         timeout_secs=60,
         max_retries=3,
     )
@@ -757,7 +743,7 @@ def main():
         augmented_prompt_path=aug_path,
         out_dir=DIR_OUT / "sketch",
         model="gpt-5-chat-latest",
-        base_url="https://api.openai.com/v1",
+        base_url=OPENAI_BASE_URL,
         timeout_secs=60,
         max_retries=3,
     )
@@ -778,26 +764,35 @@ def main():
     top, mods = load_hierarchy(DIR_OUT / "module_index.json")
     order = postorder_modules(top, mods)
 
+    # every module's query is known now: embed + search them all in one pass, off the per-module path
+    ifaces = {mn: interface_from_sketch(Path(mods[mn]["filename"])) for mn in order}
+    iface_fps = {mn: interface_fingerprint(Path(mods[mn]["filename"]).read_text()) for mn in order}
+    cand_map = retrieve_candidates_batch({mn: (mods[mn].get("description", ""), ifaces[mn]) for mn in order},
+                                         interface_fps=iface_fps)
+
     accum_sources: Dict[str, str] = {}  # module_name -> code text
+    accum_lock = threading.Lock()        # modules are built concurrently (see run_module_dag)
 
     iteration = 0
     MAX_RETRIES = 10
 
-    for mname in order:
+    def build_module(mname: str) -> bool:
         sketch_path = Path(mods[mname]["filename"])
         desc = mods[mname].get("description", "")
-        iface = interface_from_sketch(sketch_path)
+        iface = ifaces[mname]
 
-        code, meta, hit = retrieve_or_llm_generate(mname, desc, iface, score_threshold=0.35)
+        code, meta, hit = retrieve_or_llm_generate(mname, desc, iface, score_threshold=0.35,
+                                                   candidates=cand_map.get(mname))
         print(f"[{mname}] retrieval {'HIT' if hit else 'MISS'}")
 
         # --- context: child headers already accepted ---
         child_headers = {}
-        for ch in mods[mname].get("children", []):
-            if ch in accum_sources:
-                hdr = sv_header_from_code(accum_sources[ch])
-                if hdr:
-                    child_headers[ch] = hdr
+        with accum_lock:
+            accepted_children = {ch: accum_sources[ch] for ch in mods[mname].get("children", []) if ch in accum_sources}
+        for ch, ch_code in accepted_children.items():
+            hdr = sv_header_from_code(ch_code)
+            if hdr:
+                child_headers[ch] = hdr
 
         final_code, ok, msg = None, False, ""
         attempt = 0
@@ -816,29 +811,56 @@ def main():
                     f"```text\n{msg_prev[:700]}\n```"
                 )
 
-            if hit:
-                gen_code = module_generator_llm(
+            def validate_candidate(candidate: str) -> tuple[bool, str]:
+                if PRELINT_ENABLED:
+                    ok, lint = check_candidate(candidate, mname, iface)
+                    if not ok:
+                        return False, lint  # structural defect: straight into the retry feedback, no iverilog run
+                if INCREMENTAL_VALIDATION:
+                    return compile_bundle_syntax_only(validation_sources(mname, candidate, accepted_children))
+                with accum_lock:
+                    trial_sources = accum_sources.copy()
+                trial_sources[mname] = candidate
+                return compile_bundle_syntax_only(trial_sources)
+
+            if SPECULATIVE_N > 1:
+                # N candidates in parallel, each validated as it lands; first PASS wins
+                gen_code, ok, msg = speculative_module_generation(
+                    validate_candidate,
+                    n_candidates=SPECULATIVE_N,
                     module_name=mname,
                     description=desc,
                     interface_sig=iface,
                     child_headers=child_headers,
-                    retrieved_code=code,
-                    retrieved_weight=meta.get("weight"),
+                    retrieved_code=code if hit else None,
+                    retrieved_weight=meta.get("weight") if hit else None,
                     extra_notes=err_feedback,  # <--- feed compiler errors here
+                    attempt_no=attempt,
                 )
             else:
-                gen_code = module_generator_llm(
-                    module_name=mname,
-                    description=desc,
-                    interface_sig=iface,
-                    child_headers=child_headers,
-                    extra_notes=err_feedback,  # <--- feed compiler errors here
-                )
-
-            # --- Validate bundle ---
-            trial_sources = accum_sources.copy()
-            trial_sources[mname] = gen_code
-            ok, msg = compile_bundle_syntax_only(trial_sources)
+                if hit:
+                    gen_code = module_generator_llm(
+                        module_name=mname,
+                        description=desc,
+                        interface_sig=iface,
+                        child_headers=child_headers,
+                        retrieved_code=code,
+                        retrieved_weight=meta.get("weight"),
+                        extra_notes=err_feedback,  # <--- feed compiler errors here
+                        attempt_no=attempt,
+                    )
+                else:
+                    gen_code = module_generator_llm(
+                        module_name=mname,
+                        description=desc,
+                        interface_sig=iface,
+                        child_headers=child_headers,
+                        extra_notes=err_feedback,  # <--- feed compiler errors here
+                        attempt_no=attempt,
+                    )
+
+                # --- Validate bundle ---
+                ok, msg = validate_candidate(gen_code)
 
             if ok:
                 final_code = gen_code
@@ -855,7 +877,8 @@ def main():
 
         # --- Post-validation handling ---
         if ok and final_code:
-            accum_sources[mname] = final_code
+            with accum_lock:
+                accum_sources[mname] = final_code
             sketch_path.write_text(final_code)
             upsert_code_block(
                 module_name=mname,
@@ -873,10 +896,14 @@ def main():
                 update_weight(meta["point_id"], success=False)
 
 
+        return bool(ok and final_code)
+
         # iteration += 1
         # if iteration >= 2:
         #     break
 
+    # a module is dispatched once all its children are done; independent siblings run in parallel
+    run_module_dag(top, mods, build_module, max_workers=MAX_PARALLEL_MODULES)
 
 
     # 4) Index
@@ -895,9 +922,32 @@ def main():
 
     assembled_path = DIR_OUT / "assembled_design.sv"
     with open(assembled_path, "w") as f:
-        for mn, code in accum_sources.items():
+        for mn in order:  # post-order, independent of completion order
+            if mn not in accum_sources:
+                continue
+            code = accum_sources[mn]
             f.write(f"\n// ---- {mn} ----\n{code}\n")
 
+    if INCREMENTAL_VALIDATION:
+        # modules were checked against child stubs only; elaborate the whole design once
+        ok, msg = compile_bundle_syntax_only({mn: accum_sources[mn] for mn in order if mn in accum_sources})
+        print(f"[assembly] full-bundle syntax {'PASS ✅' if ok else 'FAIL ❌'}")
+        logging.info("Assembly full-bundle check: %s", "PASS" if ok else f"FAIL\n{msg[:2000]}")
+
+    logging.info("LLM transport timings (per stage): %s", json.dumps(timing_summary(), indent=2))
+    logging.info("LLM response cache (per stage): %s", json.dumps(cache_stats(), indent=2))
+    logging.info("Embedding cache: %s", emb_cache_stats())
+    logging.info("Token usage: %s", json.dumps(usage_report(), indent=2))
+    logging.info("Rate limiter: %s", rate_limiter_stats())
+    flush_weight_updates()
+    logging.info("Weight journal: %s", weight_journal_stats())
+    logging.info("GC sweeper: %s", stop_gc_sweeper())
+    logging.info("Qdrant round trips: %s", qdrant_round_trip_stats())
+    logging.info("Validation service: %s", stop_validation_service())
+    logging.info("Validation cache (hit rates): %s", vcache_stats())
+    logging.info("Pre-lint: %s", prelint_stats())
+    logging.info("Module generator stream timings: %s", json.dumps(generation_timings(), indent=2))
+
     ppa = evaluate_ppa_from_config(
         assembled_sv_path=assembled_path,
         config_path=DIR_OUT / "configuration.json",
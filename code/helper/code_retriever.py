@@ -1,16 +1,32 @@
 # ---------- Weight-Based Retrieving Engine (Step 1: RAG setup w/ OpenAI + Qdrant) ----------
-# deps: pip install qdrant-client requests xxhash
-import os, time, json, hashlib, datetime as dt
-import requests
+# deps: pip install qdrant-client httpx xxhash
+import os, time, json, hashlib, threading, functools, datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, SetPayload, SetPayloadOperation, PointIdsList, HasIdCondition, QueryRequest
+from qdrant_client.models import (ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization,
+                                  BinaryQuantizationConfig, SearchParams, QuantizationSearchParams)
 import xxhash
 import uuid
 import logging
 import re
 from dotenv import load_dotenv
+try:
+    from helper.llm_client import post_json, chat_completion
+    from helper.embedding_cache import emb_cache_get_many, emb_cache_put_many
+    from helper.local_index import local_index, VECTOR_QUANT, QUANT_OVERSAMPLING
+    from helper.weight_journal import open_journal
+    from helper.lexical_index import LexicalIndex
+    from helper.interface_fingerprint import FingerprintTable, interface_fingerprint, name_similarity
+except ImportError:  # imported from inside helper/ (e.g. one_time_seed.py)
+    from llm_client import post_json, chat_completion
+    from embedding_cache import emb_cache_get_many, emb_cache_put_many
+    from local_index import local_index, VECTOR_QUANT, QUANT_OVERSAMPLING
+    from weight_journal import open_journal
+    from lexical_index import LexicalIndex
+    from interface_fingerprint import FingerprintTable, interface_fingerprint, name_similarity
 load_dotenv()
 
 # ---- Config (env-driven) ----
@@ -22,7 +38,28 @@ OPENAI_BASE_URL  = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 QDRANT_URL       = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY   = os.getenv("QDRANT_API_KEY")  # optional if local
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "hivegen_code_lib")
+QDRANT_GRPC      = os.getenv("HIVEGEN_QDRANT_GRPC", "0") not in ("0", "false", "False")  # prefer gRPC (port QDRANT_GRPC_PORT)
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_REUSE     = os.getenv("HIVEGEN_QDRANT_REUSE", "1") not in ("0", "false", "False")  # 0 = client + get_collection per call (baseline)
+VECTOR_BACKEND   = os.getenv("HIVEGEN_VECTOR_BACKEND", "qdrant").lower()  # "qdrant" | "local" (helper/local_index.py)
 EMB_DIMS = int(os.getenv("OPENAI_EMB_DIMS", "1536"))  # 1536 for -small, 3072 for -large
+EMB_BATCH_MAX_ITEMS  = int(os.getenv("OPENAI_EMB_BATCH_MAX_ITEMS", "256"))     # inputs per /embeddings request
+EMB_BATCH_MAX_TOKENS = int(os.getenv("OPENAI_EMB_BATCH_MAX_TOKENS", "60000"))  # approx tokens per request
+EMB_BATCH_CONCURRENCY = int(os.getenv("OPENAI_EMB_BATCH_CONCURRENCY", "4"))    # packs in flight
+SEARCH_PAYLOAD_FIELDS = ["weight", "module_name", "interface_sig", "gc"]      # ranking fields; code_text is fetched for the winner only
+WEIGHT_PAYLOAD_FIELDS = ["weight", "success_count", "fail_count", "gc", "second_chance_given"]
+HYBRID_MODE          = os.getenv("HIVEGEN_HYBRID", "fuse").lower()   # "fuse" | "prefilter" | "off" (BM25 over ports + module name)
+HYBRID_ALPHA         = float(os.getenv("HIVEGEN_HYBRID_ALPHA", "0.5"))  # fused = cos + alpha * bm25 * (1 - cos)
+LEXICAL_TOP_K        = int(os.getenv("HIVEGEN_LEXICAL_TOP_K", "50"))
+LEXICAL_EXACT_MIN    = float(os.getenv("HIVEGEN_LEXICAL_EXACT_MIN", "0.9"))  # same port set + bm25 >= this + name (FP_NAME_MIN) -> no embedding call
+FP_FASTPATH          = os.getenv("HIVEGEN_FP_FASTPATH", "1") not in ("0", "false", "False")  # exact header fingerprint -> no embedding
+FP_NAME_MIN          = float(os.getenv("HIVEGEN_FP_NAME_MIN", "1.0"))  # module-name similarity a fingerprint hit needs to skip embedding
+WEIGHT_WRITE_BEHIND  = os.getenv("HIVEGEN_WEIGHT_WRITE_BEHIND", "1") not in ("0", "false", "False")  # journal + batched flush
+WEIGHT_FLUSH_SECS    = float(os.getenv("HIVEGEN_WEIGHT_FLUSH_SECS", "5"))
+WEIGHT_JOURNAL_DIR   = Path(os.getenv("HIVEGEN_WEIGHT_JOURNAL_DIR", str(Path(__file__).resolve().parent.parent / "cache")))
+BULK_BATCH_SIZE      = int(os.getenv("HIVEGEN_BULK_BATCH_SIZE", "256"))         # points per bulk upsert request
+BULK_CONFIRM_EVERY   = int(os.getenv("HIVEGEN_BULK_CONFIRM_EVERY", "8"))        # batches between wait=True checkpoints
+BULK_CHECKPOINT_DIR  = Path(os.getenv("HIVEGEN_BULK_CHECKPOINT_DIR", str(Path(__file__).resolve().parent.parent / "cache" / "bulk_upsert")))
 
 # ---- Helpers ----
 def _now_iso() -> str:
@@ -32,58 +69,213 @@ def _sha1(s: str) -> str:
     return hashlib.sha1(s.encode("utf-8")).hexdigest()
 
 def _fast_hash(s: str) -> str:
-    return xxhash.xxh64(s).hexdigest()
+    return xxhash.xxh64(s.encode("utf-8")).hexdigest()
 
-def get_embedding(text: str) -> List[float]:
-    if not OPENAI_API_KEY:
-        raise RuntimeError("Missing OPENAI_API_KEY")
+def _approx_tokens(s: str) -> int:
+    # ~4 chars/token for English + code; only used to size request packs
+    return len(s) // 4 + 1
+
+def _pack_texts(texts: List[str], max_items: int, max_tokens: int) -> List[List[int]]:
+    """Greedy packing of input indices into requests bounded by item count and approx tokens."""
+    packs: List[List[int]] = []
+    cur: List[int] = []
+    cur_tok = 0
+    for i, t in enumerate(texts):
+        tok = _approx_tokens(t)
+        if cur and (len(cur) >= max_items or cur_tok + tok > max_tokens):
+            packs.append(cur)
+            cur, cur_tok = [], 0
+        cur.append(i)
+        cur_tok += tok
+    if cur:
+        packs.append(cur)
+    return packs
+
+def _embed_pack(inputs: List[str]) -> List[List[float]]:
     url = f"{EMB_BASE_URL.rstrip('/')}/embeddings"
-    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": EMB_MODEL, "input": text}
+    payload = {"model": EMB_MODEL, "input": inputs}
     for attempt in range(1, 4):
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
         try:
-            resp.raise_for_status()
-            return resp.json()["data"][0]["embedding"]
+            resp_json = post_json(url, payload, api_key=OPENAI_API_KEY, timeout=60, stage="embedding")
+            data = sorted(resp_json["data"], key=lambda d: d.get("index", 0))
+            if len(data) != len(inputs):
+                raise RuntimeError(f"Embedding count mismatch: sent {len(inputs)}, got {len(data)}")
+            return [d["embedding"] for d in data]
         except Exception as e:
             if attempt == 3: raise
             time.sleep(1.2 * attempt)
 
+def get_embeddings(
+    texts: List[str],
+    *,
+    max_items: int = EMB_BATCH_MAX_ITEMS,
+    max_tokens: int = EMB_BATCH_MAX_TOKENS,
+    concurrency: int = EMB_BATCH_CONCURRENCY,
+) -> List[List[float]]:
+    """
+    Embed many strings with as few /embeddings requests as possible.
+    Inputs are packed by item count and approx token budget, packs run concurrently,
+    and vectors come back in input order.
+    Texts already in the on-disk embedding cache (model, dims, xxh64) are not sent;
+    duplicates within one call are sent once.
+    """
+    if not texts:
+        return []
+    hashes = [_fast_hash(t) for t in texts]
+    out: List[Optional[List[float]]] = emb_cache_get_many(EMB_MODEL, EMB_DIMS, hashes)
+
+    first_miss: Dict[str, int] = {}
+    for i, (h, v) in enumerate(zip(hashes, out)):
+        if v is None:
+            first_miss.setdefault(h, i)
+    if not first_miss:
+        return out
+    if not OPENAI_API_KEY:
+        raise RuntimeError("Missing OPENAI_API_KEY")
+
+    miss_texts = [texts[i] for i in first_miss.values()]
+    packs = _pack_texts(miss_texts, max(1, max_items), max(1, max_tokens))
+    if len(packs) == 1 or concurrency <= 1:
+        results = [_embed_pack([miss_texts[i] for i in p]) for p in packs]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(packs))) as ex:
+            results = list(ex.map(lambda p: _embed_pack([miss_texts[i] for i in p]), packs))
+    fresh: Dict[str, List[float]] = {}
+    miss_hashes = list(first_miss.keys())
+    for p, vecs in zip(packs, results):
+        for j, v in zip(p, vecs):
+            fresh[miss_hashes[j]] = v
+    emb_cache_put_many(EMB_MODEL, EMB_DIMS, list(fresh.items()))
+    for i, h in enumerate(hashes):
+        if out[i] is None:
+            out[i] = fresh[h]
+    return out
+
+def get_embedding(text: str) -> List[float]:
+    return get_embeddings([text])[0]
+
+# ---- Qdrant client (process-wide) + round-trip instrumentation ----
+_qdrant_client: Optional[QdrantClient] = None
+_qdrant_lock = threading.Lock()
+_collection_ready = False          # memoised ensure_collection(); reset by any failed Qdrant call
+_rt_local = threading.local()      # per-thread round-trip counter for the current retrieval
+_rt_stats: Dict[str, Any] = {"round_trips": 0, "retrievals": 0, "retrieval_round_trips": 0, "by_op": {}}
+
+def _new_client() -> QdrantClient:
+    return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, prefer_grpc=QDRANT_GRPC, grpc_port=QDRANT_GRPC_PORT)
+
 def qdrant() -> QdrantClient:
-    return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    """Shared client (its HTTP/gRPC connections are reused); a fresh one per call if HIVEGEN_QDRANT_REUSE=0."""
+    global _qdrant_client
+    if not QDRANT_REUSE:
+        return _new_client()
+    with _qdrant_lock:
+        if _qdrant_client is None:
+            _qdrant_client = _new_client()
+        return _qdrant_client
+
+def _qcall(op: str, fn, *args, **kwargs):
+    """Run one Qdrant request, counting it; any error invalidates the collection-ready flag."""
+    global _collection_ready
+    _rt_local.count = getattr(_rt_local, "count", 0) + 1
+    with _qdrant_lock:
+        _rt_stats["round_trips"] += 1
+        _rt_stats["by_op"][op] = _rt_stats["by_op"].get(op, 0) + 1
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        _collection_ready = False
+        raise
+
+def _counts_as_retrieval(fn):
+    """Count the Qdrant round trips of one (outermost) retrieval call on this thread."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_rt_local, "depth", 0)
+        if depth == 0:
+            _rt_local.count = 0
+        _rt_local.depth = depth + 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _rt_local.depth = depth
+            if depth == 0:
+                with _qdrant_lock:
+                    _rt_stats["retrievals"] += 1
+                    _rt_stats["retrieval_round_trips"] += _rt_local.count
+    return wrapper
+
+def qdrant_round_trip_stats() -> Dict[str, Any]:
+    """Round trips per retrieval (compare HIVEGEN_QDRANT_REUSE=0 vs 1)."""
+    with _qdrant_lock:
+        n = _rt_stats["retrievals"]
+        return {
+            "mode": "shared_client+memo" if QDRANT_REUSE else "per_call",
+            "transport": "grpc" if QDRANT_GRPC else "http",
+            "retrievals": n,
+            "round_trips_per_retrieval": round(_rt_stats["retrieval_round_trips"] / n, 2) if n else 0.0,
+            "round_trips": _rt_stats["round_trips"],
+            "by_op": dict(_rt_stats["by_op"]),
+        }
+
+def _local():
+    return local_index(QDRANT_COLLECTION, EMB_DIMS) if VECTOR_BACKEND == "local" else None
+
+def _quantization_config():
+    """Qdrant counterpart of HIVEGEN_VECTOR_QUANT: codes kept in RAM, originals on disk for rescoring."""
+    if VECTOR_QUANT == "int8":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if VECTOR_QUANT == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+_QUANT_SEARCH = (SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=QUANT_OVERSAMPLING))
+                 if VECTOR_QUANT != "none" else None)
 
 def ensure_collection():
+    global _collection_ready
+    if _local() is not None:
+        return  # created on first use
+    if _collection_ready and QDRANT_REUSE:
+        return
     client = qdrant()
     exists = False
     try:
-        client.get_collection(QDRANT_COLLECTION)
+        _qcall("get_collection", client.get_collection, QDRANT_COLLECTION)
         exists = True
     except Exception:
         exists = False
     if not exists:
-        client.recreate_collection(
+        _qcall("recreate_collection", client.recreate_collection,
             collection_name=QDRANT_COLLECTION,
-            vectors_config=VectorParams(size=EMB_DIMS, distance=Distance.COSINE),
+            vectors_config=VectorParams(size=EMB_DIMS, distance=Distance.COSINE, on_disk=VECTOR_QUANT != "none"),
+            quantization_config=_quantization_config(),
         )
+    elif VECTOR_QUANT != "none":
+        # existing collection: Qdrant builds the codes in the background, search keeps working meanwhile
+        _qcall("update_collection", client.update_collection,
+            collection_name=QDRANT_COLLECTION,
+            quantization_config=_quantization_config(),
+        )
+    _collection_ready = True
 
 # ---- Library: upsert / search ----
+_NOT_GC = Filter(must_not=[FieldCondition(key="gc", match=MatchValue(value=True))])  # GC-flagged points never rank
+
 def build_module_query_token(name: str, description: str, interface_sig: List[str]) -> str:
     # compact, stable text for embedding similarity
     sig = ", ".join(interface_sig) if interface_sig else ""
     return f"module: {name}\ndesc: {description}\nports: {sig}"
 
-def upsert_code_block(
+def _point_record(
     module_name: str,
     description: str,
     interface_sig: List[str],
     code_text: str,
     weight: float = 0.5,
     tags: Optional[List[str]] = None,
-) -> str:
-    ensure_collection()
-    client = qdrant()
-    token = build_module_query_token(module_name, description, interface_sig)
-    vec = get_embedding(token)
+) -> Tuple[str, Dict[str, Any]]:
+    """(point_id, payload) for a new library entry."""
     h = _sha1(code_text)
     # point_id must be UUID or int — use uuid5 for deterministic ID
     point_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, module_name + ":" + h))
@@ -99,60 +291,417 @@ def upsert_code_block(
         "success_count": 0,
         "fail_count": 0,
         "content_hash": h,
+        "iface_fp": interface_fingerprint(code_text),
         "tags": tags or [],
     }
-    client.upsert(
-        collection_name=QDRANT_COLLECTION,
-        points=[PointStruct(id=point_id, vector=vec, payload=payload)],
-        wait=True,
-    )
+    return point_id, payload
+
+def upsert_code_block(
+    module_name: str,
+    description: str,
+    interface_sig: List[str],
+    code_text: str,
+    weight: float = 0.5,
+    tags: Optional[List[str]] = None,
+    vector: Optional[List[float]] = None,   # precomputed (bulk paths embed via get_embeddings)
+) -> str:
+    point_id, payload = _point_record(module_name, description, interface_sig, code_text, weight, tags)
+    # same module name + content hash => same point: refresh its payload, skip embedding + vector write
+    if _local() is None:
+        ensure_collection()
+    existing = get_points([point_id], fields=["tags"])  # id lookup = (module_name, content_hash) lookup
+    if existing:
+        old_tags = existing[0]["payload"].get("tags") or []
+        # journaled reinforcement events predate this write; apply them first so the result
+        # matches synchronous updates (HIVEGEN_WEIGHT_WRITE_BEHIND=0) regardless of flush timing
+        flush_weight_updates()
+        _set_payloads({point_id: {
+            "weight": float(weight),
+            "tags": old_tags + [t for t in (tags or []) if t not in old_tags],
+            "last_used": _now_iso(),
+        }})
+        return point_id
+    vec = vector
+    if vec is None:
+        token = build_module_query_token(module_name, description, interface_sig)
+        vec = get_embedding(token)
+    idx = _local()
+    if idx is not None:
+        idx.upsert([{"id": point_id, "vector": vec, "payload": payload}])
+    else:
+        client = qdrant()
+        _qcall("upsert", client.upsert,
+            collection_name=QDRANT_COLLECTION,
+            points=[PointStruct(id=point_id, vector=vec, payload=payload)],
+            wait=True,
+        )
+    _lexical_add(point_id, module_name, interface_sig)
+    _fingerprint_add(point_id, payload["iface_fp"], module_name)
     return point_id
 
+def bulk_upsert_code_blocks(
+    blocks: List[Dict[str, Any]],
+    *,
+    batch_size: int = BULK_BATCH_SIZE,
+    confirm_every: int = BULK_CONFIRM_EVERY,
+    checkpoint_path: Optional[Path] = None,
+    resume: bool = True,
+) -> Dict[str, Any]:
+    """
+    Ingest many code blocks: {module_name, description, interface_sig, code_text, [weight], [tags]}.
+    Each batch is embedded with one get_embeddings() call and written with upsert(wait=False);
+    every `confirm_every`-th batch (and the last) is sent with wait=True, which returns only once
+    all earlier updates are applied. Confirmed point ids are appended to a checkpoint file, so an
+    interrupted import resumes where it left off (point ids are deterministic, re-sends are harmless).
+    The default checkpoint is specific to this block list and is deleted once the import completes,
+    so a later import of the same blocks (e.g. after GC or a recreated collection) writes them again.
+    Blocks whose point already exists are not re-embedded or overwritten: only new tags are merged
+    in, so learned weight / success / fail history survives a re-import.
+    Returns throughput stats.
+    """
+    t_start = time.perf_counter()
+    idx = _local()
+    all_records = [
+        _point_record(b["module_name"], b.get("description", ""), b.get("interface_sig") or [],
+                      b["code_text"], b.get("weight", 0.5), b.get("tags"))
+        for b in blocks
+    ]
+    if checkpoint_path is None:
+        run_id = hashlib.sha1("\n".join(sorted(pid for pid, _ in all_records)).encode()).hexdigest()[:16]
+        checkpoint_path = BULK_CHECKPOINT_DIR / f"{QDRANT_COLLECTION}.{VECTOR_BACKEND}.{run_id}.done"
+    checkpoint_path = Path(checkpoint_path)
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    done = set(checkpoint_path.read_text().split()) if (resume and checkpoint_path.exists()) else set()
+
+    records = [(pid, payload) for pid, payload in all_records if pid not in done]
+    skipped = len(blocks) - len(records)
+    if idx is None and records:
+        ensure_collection()
+        client = qdrant()
+
+    # same id = same module name + content: keep live points, only merge new tags (like upsert_code_block)
+    n_existing, step = 0, max(1, batch_size)
+    for i in range(0, len(records), step):
+        chunk = records[i:i + step]
+        existing = {p["id"]: p["payload"] for p in get_points([pid for pid, _ in chunk], fields=["tags"])}
+        tag_updates = {}
+        for pid, p in chunk:
+            if pid in existing:
+                old_tags = existing[pid].get("tags") or []
+                new_tags = [t for t in p["tags"] if t not in old_tags]
+                if new_tags:
+                    tag_updates[pid] = {"tags": old_tags + new_tags}
+        _set_payloads(tag_updates)
+        n_existing += len(existing)
+        done.update(existing)
+    records = [(pid, p) for pid, p in records if pid not in done]
+
+    embed_secs = write_secs = 0.0
+    unconfirmed: List[str] = []
+    batches = [records[i:i + step] for i in range(0, len(records), step)]
+    for bi, batch in enumerate(batches):
+        t0 = time.perf_counter()
+        vecs = get_embeddings([build_module_query_token(p["module_name"], p["description"], p["interface_sig"])
+                               for _, p in batch])
+        t1 = time.perf_counter()
+        confirm = (bi + 1) % max(1, confirm_every) == 0 or bi == len(batches) - 1
+        if idx is not None:
+            idx.upsert([{"id": pid, "vector": v, "payload": p} for (pid, p), v in zip(batch, vecs)])
+        else:
+            _qcall("upsert", client.upsert,
+                collection_name=QDRANT_COLLECTION,
+                points=[PointStruct(id=pid, vector=v, payload=p) for (pid, p), v in zip(batch, vecs)],
+                wait=confirm,
+            )
+        for pid, p in batch:
+            _lexical_add(pid, p["module_name"], p["interface_sig"])
+            _fingerprint_add(pid, p["iface_fp"], p["module_name"])
+        write_secs += time.perf_counter() - t1
+        embed_secs += t1 - t0
+        unconfirmed.extend(pid for pid, _ in batch)
+        if confirm:
+            with open(checkpoint_path, "a") as f:
+                f.write("".join(pid + "\n" for pid in unconfirmed))
+            unconfirmed = []
+            logging.info("[bulk_upsert] %d/%d batches confirmed", bi + 1, len(batches))
+    checkpoint_path.unlink(missing_ok=True)   # import complete; nothing left to resume
+
+    secs = time.perf_counter() - t_start
+    stats = {
+        "total": len(blocks),
+        "skipped_resumed": skipped,
+        "already_present": n_existing,
+        "written": len(records),
+        "batches": len(batches),
+        "secs": round(secs, 3),
+        "embed_secs": round(embed_secs, 3),
+        "write_secs": round(write_secs, 3),
+        "points_per_sec": round(len(records) / secs, 1) if secs > 0 else 0.0,
+    }
+    logging.info("[bulk_upsert] %s", stats)
+    return stats
+
+# ---- Lexical (BM25) side of hybrid retrieval ----
+_lex_index: Optional[LexicalIndex] = None
+_lex_lock = threading.Lock()
+
+def _lexical() -> LexicalIndex:
+    """Process-wide BM25 index, built from the library on first use (projected scroll)."""
+    global _lex_index
+    with _lex_lock:
+        if _lex_index is None:
+            lex, offset = LexicalIndex(), None
+            while True:
+                pts, offset = scroll_points(offset, 1024, fields=["module_name", "interface_sig", "gc"])
+                for p in pts:
+                    if not p["payload"].get("gc"):
+                        lex.add(p["id"], p["payload"].get("module_name", ""), p["payload"].get("interface_sig") or [])
+                if offset is None:
+                    break
+            logging.info("[code_retriever] lexical index built: %d points", len(lex))
+            _lex_index = lex
+        return _lex_index
+
+def _lexical_add(point_id: str, module_name: str, interface_sig: List[str]) -> None:
+    if _lex_index is not None:  # not built yet -> the build will pick the point up
+        _lex_index.add(point_id, module_name, interface_sig)
+
+def _lexical_only_candidates(hits: List[Tuple[str, float]], payload_fields: Optional[List[str]], scale: float = 1.0,
+                             label: str = "lexical") -> List[Dict[str, Any]]:
+    """Candidates found without a vector (no cosine computed): score = scale * hit score * weight."""
+    if not hits:
+        return []
+    fields = None if payload_fields is None else list(dict.fromkeys(payload_fields + ["weight", "gc"]))
+    lex = dict(hits)
+    out = []
+    for p in get_points([pid for pid, _ in hits], fields=fields):
+        pl = p["payload"]
+        if pl.get("gc"):
+            continue
+        w = float(pl.get("weight", 0.5))
+        out.append({"point_id": p["id"], "cosine": 0.0, label: lex[p["id"]], "weight": w,
+                    "score": scale * lex[p["id"]] * w, "payload": pl})
+    out.sort(key=lambda x: x["score"], reverse=True)
+    return out
+
+# ---- Exact-interface fast path (header fingerprint -> point ids) ----
+_fp_table: Optional[FingerprintTable] = None
+_fp_lock = threading.Lock()
+
+def _fingerprints() -> FingerprintTable:
+    """Process-wide fingerprint table, built on first use; points stored before `iface_fp`
+    existed are fingerprinted from their code once and the field is written back."""
+    global _fp_table
+    with _fp_lock:
+        if _fp_table is None:
+            table, offset, missing = FingerprintTable(), None, []
+            while True:
+                pts, offset = scroll_points(offset, 1024, fields=["iface_fp", "module_name", "gc"])
+                for p in pts:
+                    pl = p["payload"]
+                    if pl.get("gc"):
+                        continue
+                    if "iface_fp" in pl:
+                        table.add(p["id"], pl["iface_fp"], pl.get("module_name", ""))
+                    else:
+                        missing.append(p["id"])
+                if offset is None:
+                    break
+            for i in range(0, len(missing), 256):
+                pts = get_points(missing[i:i + 256], fields=["code_text", "module_name"])
+                fps = {p["id"]: interface_fingerprint(p["payload"].get("code_text", "")) for p in pts}
+                for p in pts:
+                    table.add(p["id"], fps[p["id"]], p["payload"].get("module_name", ""))
+                _set_payloads({pid: {"iface_fp": fp} for pid, fp in fps.items()})
+            logging.info("[code_retriever] fingerprint table built: %d points (%d backfilled)", len(table), len(missing))
+            _fp_table = table
+        return _fp_table
+
+def _fingerprint_add(point_id: str, fingerprint: str, module_name: str) -> None:
+    if _fp_table is not None:  # not built yet -> the build will pick the point up
+        _fp_table.add(point_id, fingerprint, module_name)
+
+def _fuse(ranked: List[Dict[str, Any]], lex_score: Dict[str, float], payload_fields: Optional[List[str]], top_k: int) -> List[Dict[str, Any]]:
+    """Boost vector candidates by their BM25 score; in "fuse" mode also admit strong lexical-only hits."""
+    seen = set()
+    for c in ranked:
+        lx = lex_score.get(str(c["point_id"]), 0.0)
+        c["lexical"] = lx
+        c["score"] = (c["cosine"] + HYBRID_ALPHA * lx * (1.0 - c["cosine"])) * c["weight"]
+        seen.add(str(c["point_id"]))
+    if HYBRID_MODE == "fuse":
+        missing = sorted(((pid, s) for pid, s in lex_score.items() if pid not in seen), key=lambda kv: kv[1], reverse=True)
+        ranked = ranked + _lexical_only_candidates(missing[:top_k], payload_fields, scale=HYBRID_ALPHA)
+    return ranked
+
+@_counts_as_retrieval
 def search_candidates(
     module_name: str,
     description: str,
     interface_sig: List[str],
     top_k: int = 5,
     min_cosine: float = 0.30,
+    payload_fields: Optional[List[str]] = None,
+    interface_fp: str = "",
 ) -> List[Dict[str, Any]]:
-    """Return top-k by (cosine * weight), including raw cosine and payload."""
-    ensure_collection()
+    """
+    Return top-k by (cosine * weight), including raw cosine and payload.
+    `interface_fp` (interface_fingerprint() of the sketch header): library points with the
+    same fingerprint and a matching module name (HIVEGEN_FP_NAME_MIN) are returned first, by
+    weight and without an embedding call (`exact_interface` set); other fingerprint matches
+    go through the normal vector search, so the description still has to agree.
+    See helper/interface_fingerprint.py.
+    With HIVEGEN_HYBRID, BM25 over ports/module name (helper/lexical_index.py) is fused in
+    (score = (cos + alpha*bm25*(1-cos)) * weight) or used as a prefilter, and an exact port-set
+    match whose module name also agrees (HIVEGEN_FP_NAME_MIN) is returned without an embedding
+    call (cosine 0.0, `lexical` set).
+    `payload_fields` limits the payload transferred per candidate (None = full payload,
+    e.g. SEARCH_PAYLOAD_FIELDS + fetch_code() for the winner).
+    """
+    return search_candidates_batch([(module_name, description, interface_sig)], top_k=top_k,
+                                   min_cosine=min_cosine, payload_fields=payload_fields,
+                                   interface_fps=[interface_fp])[0]
+
+@_counts_as_retrieval
+def search_candidates_batch(
+    queries: List[Tuple[str, str, List[str]]],
+    *,
+    top_k: int = 5,
+    min_cosine: float = 0.30,
+    payload_fields: Optional[List[str]] = None,
+    interface_fps: Optional[List[str]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    search_candidates() for many (module_name, description, interface_sig) at once: the query
+    tokens that need a vector are embedded in one get_embeddings() call and searched in one
+    pass (Qdrant query_batch_points / LocalVectorIndex.search_batch). Results in input order.
+    """
+    out: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+    pending = []   # (position, lexical scores, prefilter ids)
+    for i, (name, _, sig) in enumerate(queries):
+        fp = interface_fps[i] if interface_fps else ""
+        if fp and FP_FASTPATH:
+            hits = _fingerprints().lookup(fp, name, min_name_sim=FP_NAME_MIN)
+            ranked = _lexical_only_candidates([(pid, 1.0) for pid, _ in hits], payload_fields, label="exact_interface")
+            if ranked:
+                out[i] = ranked[:top_k]
+                continue
+        lex = _lexical().search(name, sig, top_k=LEXICAL_TOP_K) if HYBRID_MODE != "off" else []
+        # same ports alone can be another function (pe vs alu_core): the name has to agree too
+        exact = [(pid, s) for pid, s, same_ports in lex
+                 if same_ports and s >= LEXICAL_EXACT_MIN and name_similarity(name, _lexical().name_of(pid)) >= FP_NAME_MIN]
+        ranked = _lexical_only_candidates(exact, payload_fields) if exact else []  # exact-interface hit: no embedding
+        if ranked:
+            out[i] = ranked[:top_k]
+            continue
+        lex_score = {pid: s for pid, s, _ in lex}
+        pending.append((i, lex_score, list(lex_score) if (HYBRID_MODE == "prefilter" and lex_score) else None))
+    if not pending:
+        return out
+
+    q_vecs = get_embeddings([build_module_query_token(*queries[i]) for i, _, _ in pending])
+    limit = max(20, top_k * 3)  # broaden first, we'll re-rank with weight
+    idx = _local()
+    if idx is not None:
+        results = idx.search_batch(q_vecs, top_k=limit, min_cosine=min_cosine,
+                                   payload_fields=payload_fields, ids=[only for _, _, only in pending])
+    else:
+        ensure_collection()
+        client = qdrant()
+        # query_batch_points: the current client's replacement for search_batch (one request)
+        responses = _qcall("query_batch_points", client.query_batch_points,
+            collection_name=QDRANT_COLLECTION,
+            requests=[QueryRequest(
+                query=v,
+                limit=limit,
+                with_payload=payload_fields if payload_fields is not None else True,
+                score_threshold=min_cosine,  # cosine threshold
+                params=_QUANT_SEARCH,  # quantised: oversample on codes, rescore with originals
+                filter=_NOT_GC if only is None else Filter(
+                    must=[HasIdCondition(has_id=only)], must_not=_NOT_GC.must_not),
+            ) for v, (_, _, only) in zip(q_vecs, pending)],
+        )
+        results = []
+        for resp in responses:
+            ranked = []
+            for r in resp.points:
+                pl = r.payload or {}
+                w = float(pl.get("weight", 0.5))
+                ranked.append({
+                    "point_id": r.id,
+                    "cosine": float(r.score),
+                    "weight": w,
+                    "score": float(r.score) * w,
+                    "payload": pl,
+                })
+            results.append(ranked)
+    for (i, lex_score, _), ranked in zip(pending, results):
+        if lex_score:
+            ranked = _fuse(ranked, lex_score, payload_fields, top_k)
+        ranked.sort(key=lambda x: x["score"], reverse=True)
+        out[i] = ranked[:top_k]
+    return out
+
+def fetch_code(point_id: str, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Payload fields (default: code_text, tags) of one point; {} if it no longer exists."""
+    fields = fields or ["code_text", "tags"]
+    idx = _local()
+    if idx is not None:
+        pts = idx.retrieve([point_id], fields=fields)
+        return pts[0]["payload"] if pts else {}
     client = qdrant()
-    query = build_module_query_token(module_name, description, interface_sig)
-    q_vec = get_embedding(query)
+    pts = _qcall("retrieve", client.retrieve, QDRANT_COLLECTION, ids=[point_id], with_payload=fields)
+    return (pts[0].payload or {}) if pts else {}
 
-    results = client.search(
+# ---- Maintenance primitives (used by gc_sweeper) ----
+def scroll_points(offset: Any = None, limit: int = 256, fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Any]:
+    """One page of {"id", "payload"} (payload limited to `fields`); returns (points, next_offset or None)."""
+    idx = _local()
+    if idx is not None:
+        return idx.scroll(offset or 0, limit, fields)
+    ensure_collection()
+    client = qdrant()
+    pts, nxt = _qcall("scroll", client.scroll,
         collection_name=QDRANT_COLLECTION,
-        query_vector=q_vec,
-        limit=max(20, top_k * 3),  # broaden first, we'll re-rank with weight
-        with_payload=True,
-        score_threshold=min_cosine,  # cosine threshold
+        offset=offset,
+        limit=limit,
+        with_payload=fields if fields is not None else True,
+        with_vectors=False,
     )
-    ranked = []
-    for r in results:
-        pl = r.payload or {}
-        w = float(pl.get("weight", 0.5))
-        ranked.append({
-            "point_id": r.id,
-            "cosine": float(r.score),
-            "weight": w,
-            "score": float(r.score) * w,
-            "payload": pl,
-        })
-    ranked.sort(key=lambda x: x["score"], reverse=True)
-    return ranked[:top_k]
+    return [{"id": str(p.id), "payload": p.payload or {}} for p in pts], nxt
 
-# ---- Weight updates (paper-style) ----
-def update_weight(point_id: str, *, success: bool, second_chance_given: bool = False) -> None:
-    """
-    W *= 1.06 on success; W *= 0.9 on fail.
-    If fail and W < 0.3 and not second_chance_given -> reset to 0.5 once.
-    If W < 0.2 -> mark for GC (set 'gc': true).
-    """
+def get_points(point_ids: List[str], fields: Optional[List[str]] = None, with_vectors: bool = False) -> List[Dict[str, Any]]:
+    """Full (or projected) payloads, optionally with vectors, for the given ids."""
+    idx = _local()
+    if idx is not None:
+        pts = idx.retrieve(point_ids, fields=fields)
+        if with_vectors:
+            for p in pts:
+                p["vector"] = idx.vector(p["id"])
+        return pts
+    client = qdrant()
+    pts = _qcall("retrieve", client.retrieve, QDRANT_COLLECTION, ids=point_ids,
+                 with_payload=fields if fields is not None else True, with_vectors=with_vectors)
+    return [{"id": str(p.id), "payload": p.payload or {}, **({"vector": p.vector} if with_vectors else {})} for p in pts]
+
+def delete_points(point_ids: List[str]) -> int:
+    if not point_ids:
+        return 0
+    if _lex_index is not None:
+        _lex_index.remove(point_ids)
+    if _fp_table is not None:
+        _fp_table.remove(point_ids)
+    idx = _local()
+    if idx is not None:
+        return idx.delete(point_ids)
     client = qdrant()
-    pts = client.retrieve(QDRANT_COLLECTION, ids=[point_id], with_payload=True)
-    if not pts: return
-    pl = pts[0].payload or {}
+    _qcall("delete", client.delete, collection_name=QDRANT_COLLECTION,
+           points_selector=PointIdsList(points=point_ids), wait=True)
+    return len(point_ids)
+
+# ---- Reinforcement rules + write-behind flush ----
+def _reinforce(pl: Dict[str, Any], success: bool, second_chance_given: bool, ts: str) -> Dict[str, Any]:
+    """Apply one reinforcement event to the bookkeeping fields `pl` (in place) and return it."""
     w = float(pl.get("weight", 0.5))
     succ = int(pl.get("success_count", 0))
     fail = int(pl.get("fail_count", 0))
@@ -176,12 +725,94 @@ def update_weight(point_id: str, *, success: bool, second_chance_given: bool = F
         "weight": float(w),
         "success_count": succ,
         "fail_count": fail,
-        "last_used": _now_iso(),
+        "last_used": ts,
         "gc": gc,
     })
-    client.set_payload(QDRANT_COLLECTION, payload=pl, points=[point_id])
+    return pl
+
+def _read_weight_fields(point_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    fields = WEIGHT_PAYLOAD_FIELDS + ["journal_seq"]
+    idx = _local()
+    if idx is not None:
+        return {p["id"]: p["payload"] for p in idx.retrieve(point_ids, fields=fields)}
+    client = qdrant()
+    pts = _qcall("retrieve", client.retrieve, QDRANT_COLLECTION, ids=point_ids, with_payload=fields)
+    return {str(p.id): (p.payload or {}) for p in pts}
+
+def _set_payloads(updates: Dict[str, Dict[str, Any]]) -> None:
+    """Merge per-point payload updates in one request (batch_update_points)."""
+    if not updates:
+        return
+    idx = _local()
+    if idx is not None:
+        for pid, pl in updates.items():
+            idx.set_payload(pid, pl)
+        return
+    client = qdrant()
+    if len(updates) == 1:
+        (pid, pl), = updates.items()
+        _qcall("set_payload", client.set_payload, QDRANT_COLLECTION, payload=pl, points=[pid])
+        return
+    _qcall("batch_update_points", client.batch_update_points,
+        collection_name=QDRANT_COLLECTION,
+        update_operations=[SetPayloadOperation(set_payload=SetPayload(payload=pl, points=[pid]))
+                           for pid, pl in updates.items()],
+    )
+
+def _apply_weight_events(events: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Journal flush: one read + one batched write for every point touched since the last flush."""
+    current = _read_weight_fields(list(events.keys()))
+    updates = {}
+    for pid, evs in events.items():
+        pl = current.get(pid)
+        if pl is None:
+            continue  # point deleted meanwhile
+        last = int(pl.get("journal_seq", 0))
+        fresh = [e for e in evs if int(e["seq"]) > last]
+        if not fresh:
+            continue
+        for e in fresh:
+            _reinforce(pl, e["success"], e["second_chance_given"], e["ts"])
+        pl["journal_seq"] = int(fresh[-1]["seq"])
+        updates[pid] = pl
+    _set_payloads(updates)
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def _weight_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = open_journal(WEIGHT_JOURNAL_DIR / f"weight_journal.{QDRANT_COLLECTION}.{VECTOR_BACKEND}.jsonl",
+                                    _apply_weight_events, interval_secs=WEIGHT_FLUSH_SECS)
+        return _journal
+
+def flush_weight_updates() -> int:
+    """Write all journaled reinforcement events to the library now (call at end of run)."""
+    return _weight_journal().flush() if WEIGHT_WRITE_BEHIND else 0
+
+def weight_journal_stats() -> Dict[str, Any]:
+    return _weight_journal().snapshot() if WEIGHT_WRITE_BEHIND else {"write_behind": False}
+
+# ---- Weight updates (paper-style) ----
+def update_weight(point_id: str, *, success: bool, second_chance_given: bool = False) -> None:
+    """
+    W *= 1.06 on success; W *= 0.9 on fail.
+    If fail and W < 0.3 and not second_chance_given -> reset to 0.5 once.
+    If W < 0.2 -> mark for GC (set 'gc': true).
+    With HIVEGEN_WEIGHT_WRITE_BEHIND the event is journaled and applied on the next flush.
+    """
+    if WEIGHT_WRITE_BEHIND:
+        _weight_journal().record(str(point_id), success=success, second_chance_given=second_chance_given, ts=_now_iso())
+        return
+    pl = _read_weight_fields([point_id]).get(str(point_id))
+    if pl is None: return
+    pl.pop("journal_seq", None)
+    _set_payloads({point_id: _reinforce(pl, success, second_chance_given, _now_iso())})
 
 # ---- Convenience: retrieve-or-generate decision ----
+@_counts_as_retrieval
 def retrieve_or_llm_generate(
     module_name: str,
     description: str,
@@ -189,22 +820,49 @@ def retrieve_or_llm_generate(
     *,
     score_threshold: float = 0.35,
     top_k: int = 5,
+    candidates: Optional[List[Dict[str, Any]]] = None,
+    interface_fp: str = "",
 ) -> Tuple[str, Dict[str, Any], bool]:
     """
     Returns (code_text, meta, from_library)
       - If best (cosine*weight) >= threshold -> return library code
       - Else -> signal caller to LLM-generate; caller should upsert & return that
+    `candidates` (from retrieve_candidates_batch) skips the search for this module.
     """
-    cands = search_candidates(module_name, description, interface_sig, top_k=top_k, min_cosine=0.15)
+    cands = candidates if candidates is not None else search_candidates(
+        module_name, description, interface_sig, top_k=top_k, min_cosine=0.15, payload_fields=SEARCH_PAYLOAD_FIELDS,
+        interface_fp=interface_fp)
     if not cands:
         return "", {"reason": "no_candidates"}, False
     best = cands[0]
     if best["score"] >= score_threshold:
-        code = best["payload"]["code_text"]
+        full = fetch_code(best["point_id"])  # only the winner's code crosses the wire
+        if not full.get("code_text"):
+            return "", {"reason": "winner_vanished"}, False
+        code = full["code_text"]
         update_weight(best["point_id"], success=True)  # optimistic; caller may override after validation
-        return code, {"source": "library", "point_id": best["point_id"], "cosine": best["cosine"], "weight": best["weight"], "tags": best["payload"].get("tags")}, True
+        return code, {"source": "library", "point_id": best["point_id"], "cosine": best["cosine"], "weight": best["weight"], "tags": full.get("tags")}, True
     return "", {"reason": f"below_threshold({best['score']:.3f}<{score_threshold})"}, False
 
+def retrieve_candidates_batch(
+    modules: Dict[str, Tuple[str, List[str]]],
+    *,
+    top_k: int = 5,
+    interface_fps: Optional[Dict[str, str]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Candidates for a whole hierarchy up front: {module_name: (description, interface_sig)}
+    -> {module_name: ranked candidates}, to pass as retrieve_or_llm_generate(candidates=...).
+    Same search settings as retrieve_or_llm_generate; one embeddings request + one search pass.
+    """
+    names = list(modules)
+    t0 = time.perf_counter()
+    results = search_candidates_batch([(n, *modules[n]) for n in names], top_k=top_k, min_cosine=0.15,
+                                      payload_fields=SEARCH_PAYLOAD_FIELDS,
+                                      interface_fps=[(interface_fps or {}).get(n, "") for n in names])
+    logging.info("[code_retriever] batch retrieval: %d modules in %.2fs", len(names), time.perf_counter() - t0)
+    return dict(zip(names, results))
+
 # ---- Example: wiring into our pipeline AFTER Task Manager ----
 def use_retriever_for_module(
     module_name: str,
@@ -259,10 +917,6 @@ def fallback_llm_func(module_name: str, description: str, interface_sig: list[st
     print(f"[LLM Prompt] Generating module '{prompt}' via LLM...")
 
     url = f"{OPENAI_BASE_URL}/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json",
-    }
     payload = {
         "model": OPENAI_MODEL,
         "messages": [
@@ -275,9 +929,9 @@ def fallback_llm_func(module_name: str, description: str, interface_sig: list[st
 
     for attempt in range(1, 4):
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=60)
-            resp.raise_for_status()
-            msg = resp.json()["choices"][0]["message"]["content"]
+            resp_json = chat_completion(url, payload, api_key=OPENAI_API_KEY, timeout=60, stage="fallback_llm",
+                                        meta={"module": module_name})
+            msg = resp_json["choices"][0]["message"]["content"]
             code = _extract_code_block(msg)
             return code
         except Exception as e:
@@ -0,0 +1,94 @@
+# ---------- Concurrent DAG scheduler for module generation ----------
+# The hierarchy in module_index.json is a tree/DAG over `children` edges. A module can be
+# generated as soon as every child has settled (accepted or given up on — the sequential
+# loop also moves on past a failed child), so independent siblings run side by side and
+# wall time tracks the critical path instead of the module count.
+#
+#   results = run_module_dag(top, mods, build_fn, max_workers=4)
+#     build_fn(module_name) -> bool (accepted?)
+#
+# Env: HIVEGEN_MAX_PARALLEL_MODULES (default 4; 1 = same order as postorder_modules)
+
+import os, time, logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List
+
+MAX_PARALLEL_MODULES = int(os.getenv("HIVEGEN_MAX_PARALLEL_MODULES", "4"))
+
+
+def postorder_modules(top: str, mods: Dict[str, Dict]) -> List[str]:
+    """Return modules in leaves→parents order (post-order DFS, cycle-safe).
+    Children that are not in `mods` (e.g. library primitives) are skipped."""
+    order, seen = [], set()
+
+    def dfs(n: str):
+        if n in seen: return
+        seen.add(n)
+        for ch in mods.get(n, {}).get("children", []):
+            if ch in mods:
+                dfs(ch)
+        order.append(n)
+
+    dfs(top)
+    return order  # leaves first, top last
+
+def run_module_dag(
+    top: str,
+    mods: Dict[str, Dict],
+    build_fn: Callable[[str], bool],
+    *,
+    max_workers: int = MAX_PARALLEL_MODULES,
+) -> Dict[str, bool]:
+    """
+    Run `build_fn` over every module reachable from `top`, dispatching a module once all
+    of its children have finished. Returns {module_name: accepted}.
+    Children that are not themselves in the index (e.g. library primitives) are ignored.
+    """
+    order = postorder_modules(top, mods)
+    rank = {n: i for i, n in enumerate(order)}
+    # dependencies = children that appear earlier in post-order (drops back-edges of any cycle)
+    deps = {n: {ch for ch in mods.get(n, {}).get("children", []) if ch in mods and ch in rank and rank[ch] < rank[n]} for n in order}
+    parents: Dict[str, List[str]] = {n: [] for n in order}
+    for n, ds in deps.items():
+        for d in ds:
+            parents[d].append(n)
+
+    pending = {n: len(ds) for n, ds in deps.items()}
+    ready = [n for n in order if pending[n] == 0]
+    results: Dict[str, bool] = {}
+    t_start = time.perf_counter()
+    busy_secs = 0.0
+
+    def _timed(name: str):
+        t0 = time.perf_counter()
+        try:
+            return build_fn(name)
+        finally:
+            logging.info("[dag_scheduler] %s finished in %.2fs", name, time.perf_counter() - t0)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        running = {}
+        while ready or running:
+            # keep post-order priority among ready modules (deterministic with max_workers=1)
+            ready.sort(key=rank.get)
+            while ready and len(running) < max(1, max_workers):
+                n = ready.pop(0)
+                running[ex.submit(_timed, n)] = (n, time.perf_counter())
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n, t0 = running.pop(fut)
+                busy_secs += time.perf_counter() - t0
+                try:
+                    results[n] = bool(fut.result())
+                except Exception as e:
+                    logging.exception("[dag_scheduler] %s raised: %s", n, e)
+                    results[n] = False
+                for p in parents[n]:
+                    pending[p] -= 1
+                    if pending[p] == 0:
+                        ready.append(p)
+
+    wall = time.perf_counter() - t_start
+    logging.info("[dag_scheduler] %d modules, wall=%.2fs, summed module time=%.2fs (workers=%d)",
+                 len(order), wall, busy_secs, max_workers)
+    return results
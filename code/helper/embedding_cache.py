@@ -0,0 +1,126 @@
+# ---------- Persistent embedding cache (float32 memmap + hash index) ----------
+# deps: pip install numpy
+#
+# Key = (embedding model, dims, xxh64 of the exact input text).
+# One store per (model, dims) under HIVEGEN_EMB_CACHE_DIR:
+#   <model>-<dims>/vectors.f32   -> row-major float32 matrix, append-only, read through np.memmap
+#   <model>-<dims>/index.tsv     -> "<xxh64>\t<row>" per line, appended after the row is written
+# A crash between the two appends leaves an orphan row, never a dangling index entry.
+# On open, a torn last index line and any vector bytes past the last indexed row (orphans,
+# half-written rows) are truncated, so later appends land on the row offsets they record.
+#
+# Env:
+#   HIVEGEN_EMB_CACHE=0          -> disable
+#   HIVEGEN_EMB_CACHE_DIR=<dir>  -> default: code/cache/embeddings
+
+import os, re, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+EMB_CACHE_ENABLED = os.getenv("HIVEGEN_EMB_CACHE", "1") not in ("0", "false", "False")
+EMB_CACHE_DIR     = Path(os.getenv("HIVEGEN_EMB_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "cache" / "embeddings")))
+
+_stores: Dict[Tuple[str, int], "_EmbeddingStore"] = {}
+_stores_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0}
+
+
+class _EmbeddingStore:
+    """Append-only float32 matrix for one (model, dims) pair."""
+
+    def __init__(self, root: Path, dims: int):
+        self.dims = dims
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.vec_path = root / "vectors.f32"
+        self.idx_path = root / "index.tsv"
+        self.lock = threading.Lock()
+        self.index: Dict[str, int] = {}
+        if self.idx_path.exists():
+            raw = self.idx_path.read_bytes()
+            if raw and not raw.endswith(b"\n"):  # torn last line: drop it
+                raw = raw[: raw.rfind(b"\n") + 1]
+                with open(self.idx_path, "r+b") as f:
+                    f.truncate(len(raw))
+            for line in raw.decode("utf-8", "replace").splitlines():
+                k, _, row = line.partition("\t")
+                if k and row.isdigit():
+                    self.index[k] = int(row)
+        whole = (self.vec_path.stat().st_size // (4 * dims)) if self.vec_path.exists() else 0
+        self.index = {k: r for k, r in self.index.items() if r < whole}
+        self.rows = max(self.index.values(), default=-1) + 1
+        if self.vec_path.exists() and self.vec_path.stat().st_size > self.rows * 4 * dims:
+            with open(self.vec_path, "r+b") as f:
+                f.truncate(self.rows * 4 * dims)
+        self._mm: Optional[np.memmap] = None
+
+    def _view(self) -> Optional[np.memmap]:
+        if self.rows == 0:
+            return None
+        if self._mm is None or self._mm.shape[0] < self.rows:
+            self._mm = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(self.rows, self.dims))
+        return self._mm
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        with self.lock:
+            mm = self._view()
+            out: List[Optional[List[float]]] = []
+            for k in keys:
+                row = self.index.get(k)
+                out.append(mm[row].tolist() if (mm is not None and row is not None and row < self.rows) else None)
+            return out
+
+    def put_many(self, items: Sequence[Tuple[str, Sequence[float]]]) -> int:
+        with self.lock:
+            fresh = [(k, v) for k, v in items if k not in self.index and len(v) == self.dims]
+            if not fresh:
+                return 0
+            mat = np.asarray([v for _, v in fresh], dtype=np.float32)
+            with open(self.vec_path, "ab") as f:
+                f.write(mat.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            lines = []
+            for i, (k, _) in enumerate(fresh):
+                self.index[k] = self.rows + i
+                lines.append(f"{k}\t{self.rows + i}\n")
+            with open(self.idx_path, "a") as f:
+                f.write("".join(lines))
+            self.rows += len(fresh)
+            return len(fresh)
+
+
+def _store(model: str, dims: int) -> "_EmbeddingStore":
+    key = (model, dims)
+    with _stores_lock:
+        st = _stores.get(key)
+        if st is None:
+            safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            st = _stores[key] = _EmbeddingStore(EMB_CACHE_DIR / f"{safe}-{dims}", dims)
+        return st
+
+
+# ---- Public API ----
+def emb_cache_get_many(model: str, dims: int, text_hashes: Sequence[str]) -> List[Optional[List[float]]]:
+    """Cached vectors (or None) for each xxh64 text hash, in order."""
+    if not EMB_CACHE_ENABLED:
+        return [None] * len(text_hashes)
+    got = _store(model, dims).get_many(text_hashes)
+    hits = sum(v is not None for v in got)
+    with _stores_lock:
+        _stats["hits"] += hits
+        _stats["misses"] += len(got) - hits
+    return got
+
+def emb_cache_put_many(model: str, dims: int, items: Sequence[Tuple[str, Sequence[float]]]) -> None:
+    """Persist (xxh64 text hash, vector) pairs; vectors whose length != dims are skipped."""
+    if not EMB_CACHE_ENABLED or not items:
+        return
+    n = _store(model, dims).put_many(items)
+    with _stores_lock:
+        _stats["writes"] += n
+
+def emb_cache_stats() -> Dict[str, int]:
+    with _stores_lock:
+        return dict(_stats)
@@ -0,0 +1,158 @@
+# ---------- Code-library GC sweeper (capacity-bounded library) ----------
+# update_weight() flags points with weight < 0.2 as `gc: true`; search already skips them,
+# this sweeper actually removes them and keeps the library under a size cap.
+#
+# It runs incrementally: each step scrolls ONE page of the collection (projected payload only)
+#   - removes the page's GC-flagged points right away
+#   - scores the rest for eviction
+# and at the end of a full pass, if the library is larger than HIVEGEN_LIBRARY_MAX_POINTS,
+# evicts the lowest-scoring points:
+#   keep_score = weight * (0.5 + 0.5 * 2^(-days_since_last_used / half_life)) / (1 + 0.1 * fail_count)
+# ("last used" falls back to added_at for points never retrieved.)
+#
+# Removed points are archived (payload + vector, JSONL under code/cache/gc_archive/) before the
+# delete unless HIVEGEN_GC_MODE=delete.
+#
+# Env:
+#   HIVEGEN_GC_SWEEP=1                 -> run in the background during demo runs
+#   HIVEGEN_GC_MODE=archive|delete
+#   HIVEGEN_LIBRARY_MAX_POINTS=0       -> 0 = no size cap (only GC-flagged points are removed)
+#   HIVEGEN_GC_PAGE_SIZE=256           HIVEGEN_GC_INTERVAL_SECS=2    HIVEGEN_GC_HALF_LIFE_DAYS=30
+
+import os, json, heapq, threading, logging, datetime as dt
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+try:
+    from helper.code_retriever import scroll_points, get_points, delete_points, QDRANT_COLLECTION
+except ImportError:  # imported from inside helper/
+    from code_retriever import scroll_points, get_points, delete_points, QDRANT_COLLECTION
+
+GC_SWEEP_ENABLED   = os.getenv("HIVEGEN_GC_SWEEP", "1") not in ("0", "false", "False")
+GC_MODE            = os.getenv("HIVEGEN_GC_MODE", "archive").lower()
+LIBRARY_MAX_POINTS = int(os.getenv("HIVEGEN_LIBRARY_MAX_POINTS", "0"))
+GC_PAGE_SIZE       = int(os.getenv("HIVEGEN_GC_PAGE_SIZE", "256"))
+GC_INTERVAL_SECS   = float(os.getenv("HIVEGEN_GC_INTERVAL_SECS", "2"))
+GC_HALF_LIFE_DAYS  = float(os.getenv("HIVEGEN_GC_HALF_LIFE_DAYS", "30"))
+GC_ARCHIVE_DIR     = Path(os.getenv("HIVEGEN_GC_ARCHIVE_DIR", str(Path(__file__).resolve().parent.parent / "cache" / "gc_archive")))
+
+_SCORE_FIELDS = ["weight", "last_used", "added_at", "fail_count", "gc"]
+
+
+def _parse_ts(ts: Optional[str]) -> Optional[dt.datetime]:
+    if not ts:
+        return None
+    try:
+        return dt.datetime.fromisoformat(ts.rstrip("Z"))
+    except ValueError:
+        return None
+
+def keep_score(payload: Dict[str, Any], now: Optional[dt.datetime] = None) -> float:
+    """Higher = more worth keeping (see module header)."""
+    now = now or dt.datetime.utcnow()
+    w = float(payload.get("weight", 0.5))
+    seen = _parse_ts(payload.get("last_used")) or _parse_ts(payload.get("added_at"))
+    days = max(0.0, (now - seen).total_seconds() / 86400.0) if seen else GC_HALF_LIFE_DAYS
+    recency = 0.5 ** (days / GC_HALF_LIFE_DAYS) if GC_HALF_LIFE_DAYS > 0 else 1.0
+    return w * (0.5 + 0.5 * recency) / (1.0 + 0.1 * int(payload.get("fail_count", 0)))
+
+
+class GCSweeper:
+    """Incremental sweeper; call step() repeatedly (start() does so on a daemon thread)."""
+
+    def __init__(self, *, max_points: int = LIBRARY_MAX_POINTS, mode: str = GC_MODE,
+                 page_size: int = GC_PAGE_SIZE, interval_secs: float = GC_INTERVAL_SECS):
+        self.max_points = max_points
+        self.mode = mode
+        self.page_size = max(1, page_size)
+        self.interval = interval_secs
+        self.offset: Any = None
+        self.scores: List[Tuple[float, str]] = []   # (keep_score, id) of live points seen this pass
+        self.stats = {"passes": 0, "pages": 0, "gc_removed": 0, "evicted": 0, "library_size": None}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _remove(self, ids: List[str], reason: str) -> int:
+        if not ids:
+            return 0
+        if self.mode == "archive":
+            GC_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+            pts = get_points(ids, with_vectors=True)
+            stamp = dt.datetime.utcnow().isoformat() + "Z"
+            with open(GC_ARCHIVE_DIR / f"{QDRANT_COLLECTION}.jsonl", "a") as f:
+                for p in pts:
+                    f.write(json.dumps({"archived_at": stamp, "reason": reason, **p}, ensure_ascii=False) + "\n")
+        return delete_points(ids)
+
+    def step(self) -> bool:
+        """Process one page; returns True when this step completed a full pass."""
+        with self.lock:
+            pts, nxt = scroll_points(self.offset, self.page_size, fields=_SCORE_FIELDS)
+            now = dt.datetime.utcnow()
+            flagged = [p["id"] for p in pts if p["payload"].get("gc")]
+            self.stats["gc_removed"] += self._remove(flagged, "gc")
+            self.scores.extend((keep_score(p["payload"], now), p["id"]) for p in pts if not p["payload"].get("gc"))
+            self.stats["pages"] += 1
+            self.offset = nxt
+            if nxt is not None:
+                return False
+
+            # end of pass: enforce the size cap
+            self.stats["passes"] += 1
+            size = len(self.scores)
+            if self.max_points > 0 and size > self.max_points:
+                victims = [pid for _, pid in heapq.nsmallest(size - self.max_points, self.scores)]
+                for i in range(0, len(victims), self.page_size):
+                    self.stats["evicted"] += self._remove(victims[i:i + self.page_size], "capacity")
+                size -= len(victims)
+                logging.info("[gc_sweeper] evicted %d points to stay within %d", len(victims), self.max_points)
+            self.stats["library_size"] = size
+            self.scores = []
+            return True
+
+    def run_pass(self) -> Dict[str, Any]:
+        """Finish the current pass synchronously (e.g. at the end of a run)."""
+        while not self.step():
+            pass
+        return self.snapshot()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                logging.warning("[gc_sweeper] step failed (will retry): %s", e)
+                with self.lock:
+                    self.offset, self.scores = None, []
+
+    def start(self) -> "GCSweeper":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gc-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats)
+
+
+_sweeper: Optional[GCSweeper] = None
+
+def start_gc_sweeper() -> Optional[GCSweeper]:
+    """Start the process-wide background sweeper (no-op if HIVEGEN_GC_SWEEP=0)."""
+    global _sweeper
+    if not GC_SWEEP_ENABLED:
+        return None
+    if _sweeper is None:
+        _sweeper = GCSweeper().start()
+    return _sweeper
+
+def stop_gc_sweeper() -> Dict[str, Any]:
+    """Stop the background sweeper and return its stats ({} if it was never started)."""
+    return _sweeper.stop() if _sweeper is not None else {}
@@ -0,0 +1,134 @@
+# ---------- Canonical interface fingerprint (exact-interface fast path) ----------
+# Standard modules (mux2to1, mux4to1, bit_counter, ...) often exist verbatim in the library.
+# Their ports are compared here without any embedding:
+#   fingerprint = sha1 of the sorted "name:dir:width" entries parsed from the module header
+#     name   normalised like the lexical index (lowercase, i_/_o-style affixes removed)
+#     dir    in | out | inout
+#     width  packed dims, evaluated when numeric ([7:0] and [0:7] -> 8, [1:0][7:0] -> 2x8),
+#            kept as text otherwise ([WIDTH-1:0]); "1" for scalars; "s" suffix if signed
+# Types (logic/wire/reg) and port order do not matter. Non-ANSI headers take directions and
+# widths from the body declarations.
+#
+# FingerprintTable maps fingerprint -> {point_id: module_name}; code_retriever keeps one per
+# process (built from the `iface_fp` payload field) and checks it before embedding.
+# Same ports do not mean same function (adder_8bit vs subtractor_8bit), so a match is only used
+# without an embedding when the module names also agree; name_similarity ignores width/number
+# pieces ("8", "bit", "to", ...) that the fingerprint already covers.
+
+import re, hashlib, threading
+from typing import Dict, Iterable, List, Tuple
+try:
+    from helper.lexical_index import normalise_port, name_pieces
+except ImportError:  # imported from inside helper/
+    from lexical_index import normalise_port, name_pieces
+
+_HEADER_RE = re.compile(r'(?is)\bmodule\s+(?P<name>[A-Za-z_]\w*)\s*(?:#\s*\((?P<params>.*?)\)\s*)?\((?P<ports>.*?)\)\s*;')
+_DIR_RE = re.compile(r'\b(input|output|inout)\b')
+_DIMS_RE = re.compile(r'\[([^\]]*)\]')
+_BODY_DECL_RE = re.compile(r'\b(input|output|inout)\b([^;]*);')
+_DIRS = {"input": "in", "output": "out", "inout": "inout"}
+_WIDTH_PIECES = {"to", "b", "bit", "bits", "x", "w", "wide", "width"}
+
+
+def _strip_comments(text: str) -> str:
+    return re.sub(r'/\*.*?\*/', '', re.sub(r'//[^\n]*', '', text), flags=re.S)
+
+def _width(decl: str) -> str:
+    dims = []
+    for d in _DIMS_RE.findall(decl):
+        d = re.sub(r'\s+', '', d)
+        m = re.fullmatch(r'(\d+):(\d+)', d)
+        dims.append(str(abs(int(m.group(1)) - int(m.group(2))) + 1) if m else d)
+    w = "x".join(dims) or "1"
+    return w + ("s" if re.search(r'\bsigned\b', decl) else "")
+
+def _name_of(chunk: str) -> str:
+    rest = _DIMS_RE.sub(' ', re.sub(r'=.*', '', chunk))   # drop default values and dims
+    toks = re.findall(r'[A-Za-z_]\w*', rest)
+    return toks[-1] if toks else ""
+
+def parse_ports(code: str) -> Tuple[str, List[Tuple[str, str, str]]]:
+    """(module_name, [(port, dir, width)]) from the first module header; ("", []) if none."""
+    text = _strip_comments(code)
+    m = _HEADER_RE.search(text)
+    if not m:
+        return "", []
+    ports, cur_dir, cur_width = [], "", "1"
+    for chunk in m.group("ports").split(","):
+        if not chunk.strip():
+            continue
+        d = _DIR_RE.search(chunk)
+        if d:  # a new declaration; otherwise direction/width carry over ("input a, b")
+            cur_dir, cur_width = _DIRS[d.group(1)], _width(chunk[d.end():])
+        name = _name_of(chunk)
+        if name:
+            ports.append([name, cur_dir, cur_width])
+    if any(not p[1] for p in ports):  # non-ANSI: directions live in the body
+        body = {}
+        for kind, decl in _BODY_DECL_RE.findall(text[m.end():]):
+            for n in decl.split(","):
+                body[_name_of(n)] = (_DIRS[kind], _width(decl))
+        for p in ports:
+            if not p[1] and p[0] in body:
+                p[1], p[2] = body[p[0]]
+    return m.group("name"), [tuple(p) for p in ports]
+
+def interface_fingerprint(code: str) -> str:
+    """Canonical fingerprint of the module header in `code` ("" if no ports found)."""
+    _, ports = parse_ports(code)
+    if not ports:
+        return ""
+    canon = sorted(f"{normalise_port(n)}:{d or '?'}:{w}" for n, d, w in ports)
+    return hashlib.sha1("|".join(canon).encode()).hexdigest()
+
+def _salient_pieces(name: str) -> set:
+    pieces = name_pieces(name)
+    return {p for p in pieces if not p.isdigit() and p not in _WIDTH_PIECES} or set(pieces)
+
+def name_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of module-name pieces without width/number pieces
+    (mux4to1 vs MUX_4to1 -> 1.0, adder_8bit vs subtractor_8bit -> 0.0)."""
+    pa, pb = _salient_pieces(a), _salient_pieces(b)
+    return len(pa & pb) / len(pa | pb) if (pa or pb) else 1.0
+
+
+class FingerprintTable:
+    """fingerprint -> {point_id: module_name}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_fp: Dict[str, Dict[str, str]] = {}
+        self.fp_of: Dict[str, str] = {}
+
+    def add(self, point_id: str, fingerprint: str, module_name: str) -> None:
+        if not fingerprint:
+            return
+        with self.lock:
+            self._remove(point_id)
+            self.by_fp.setdefault(fingerprint, {})[point_id] = module_name
+            self.fp_of[point_id] = fingerprint
+
+    def remove(self, point_ids: Iterable[str]) -> None:
+        with self.lock:
+            for pid in point_ids:
+                self._remove(pid)
+
+    def _remove(self, point_id: str) -> None:
+        fp = self.fp_of.pop(point_id, None)
+        if fp is not None:
+            ids = self.by_fp.get(fp, {})
+            ids.pop(point_id, None)
+            if not ids:
+                self.by_fp.pop(fp, None)
+
+    def lookup(self, fingerprint: str, module_name: str = "", *, min_name_sim: float = 0.0) -> List[Tuple[str, float]]:
+        """[(point_id, name_similarity)] with this exact fingerprint, most similar name first."""
+        if not fingerprint:
+            return []
+        with self.lock:
+            ids = dict(self.by_fp.get(fingerprint, {}))
+        hits = [(pid, name_similarity(module_name, n)) for pid, n in ids.items()]
+        return sorted((h for h in hits if h[1] >= min_name_sim), key=lambda h: h[1], reverse=True)
+
+    def __len__(self) -> int:
+        return len(self.fp_of)
@@ -0,0 +1,123 @@
+# ---------- Lexical (BM25) index over module names + interface ports ----------
+# Same port names are the strongest sign a library module can be reused, and cosine over
+# "module: … desc: … ports: …" text dilutes them. This in-memory inverted index scores
+# library points with BM25 over:
+#   p:<port>     normalised port names        (clk, rst_n, data_in, … ; "i_"/"_o"-style affixes removed)
+#   t:<piece>    port name pieces             (data, in, …)
+#   m:<piece>    module name pieces           (UART_Tx -> uart, tx ; mux4to1 -> mux, 4, to, 1)
+# Scores are normalised by the query's self-match score, so 1.0 ~ "same ports, same name".
+#
+# The index is rebuilt from the library (projected scroll) on first use and kept in sync by
+# code_retriever on upsert/delete; nothing is persisted.
+
+import re, math, threading
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+_K1, _B = 1.2, 0.75
+_AFFIX_RE = re.compile(r"^(?:i|o|io)_|_(?:i|o|io)$")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def normalise_port(name: str) -> str:
+    n = name.strip().lower()
+    return _AFFIX_RE.sub("", n) or n
+
+def name_pieces(name: str) -> List[str]:
+    return [p.lower() for chunk in re.split(r"[^A-Za-z0-9]+", name) for p in _CAMEL_RE.findall(chunk)]
+
+def port_set(interface_sig: Iterable[str]) -> Set[str]:
+    return {normalise_port(p) for p in interface_sig if p and p.strip()}
+
+def terms_for(module_name: str, interface_sig: Iterable[str]) -> List[str]:
+    ports = sorted(port_set(interface_sig))
+    terms = [f"p:{p}" for p in ports]
+    terms += [f"t:{piece}" for p in ports for piece in p.split("_") if piece]
+    terms += [f"m:{piece}" for piece in name_pieces(module_name)]
+    return terms
+
+
+class LexicalIndex:
+    """Inverted index term -> {point_id: tf} with BM25 scoring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.doc_ports: Dict[str, frozenset] = {}
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.doc_name: Dict[str, str] = {}
+        self.total_len = 0
+
+    def add(self, point_id: str, module_name: str, interface_sig: Iterable[str]) -> None:
+        sig = list(interface_sig or [])
+        terms = Counter(terms_for(module_name, sig))
+        with self.lock:
+            self._remove(point_id)
+            for t, tf in terms.items():
+                self.postings.setdefault(t, {})[point_id] = tf
+            n = sum(terms.values())
+            self.doc_len[point_id] = n
+            self.doc_ports[point_id] = frozenset(port_set(sig))
+            self.doc_terms[point_id] = list(terms)
+            self.doc_name[point_id] = module_name
+            self.total_len += n
+
+    def remove(self, point_ids: Iterable[str]) -> None:
+        with self.lock:
+            for pid in point_ids:
+                self._remove(pid)
+
+    def _remove(self, point_id: str) -> None:
+        n = self.doc_len.pop(point_id, None)
+        if n is None:
+            return
+        self.total_len -= n
+        self.doc_ports.pop(point_id, None)
+        self.doc_name.pop(point_id, None)
+        for t in self.doc_terms.pop(point_id, []):
+            docs = self.postings.get(t)
+            if docs is not None and docs.pop(point_id, None) is not None and not docs:
+                del self.postings[t]
+
+    def _bm25(self, q_terms: Counter, n_docs: int, avgdl: float, dl_of) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for t, qtf in q_terms.items():
+            docs = self.postings.get(t)
+            df = len(docs) if docs else 0
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for pid, tf in (docs or {}).items():
+                dl = dl_of(pid)
+                scores[pid] = scores.get(pid, 0.0) + qtf * idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * dl / avgdl))
+        return scores
+
+    def search(self, module_name: str, interface_sig: Iterable[str], *, top_k: int = 20) -> List[Tuple[str, float, bool]]:
+        """[(point_id, normalised BM25 in [0,1], same_port_set)] best first."""
+        sig = list(interface_sig or [])
+        q_terms = Counter(terms_for(module_name, sig))
+        if not q_terms:
+            return []
+        q_ports = frozenset(port_set(sig))
+        with self.lock:
+            n_docs = len(self.doc_len)
+            if n_docs == 0:
+                return []
+            avgdl = self.total_len / n_docs
+            scores = self._bm25(q_terms, n_docs, avgdl, self.doc_len.__getitem__)
+            # self-match: the query scored as if it were a document of its own length
+            q_len = sum(q_terms.values())
+            ideal = 0.0
+            for t, qtf in q_terms.items():
+                df = len(self.postings.get(t) or ())
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                ideal += qtf * idf * qtf * (_K1 + 1) / (qtf + _K1 * (1 - _B + _B * q_len / avgdl))
+            best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+            return [(pid, min(1.0, s / ideal) if ideal > 0 else 0.0, bool(q_ports) and self.doc_ports.get(pid) == q_ports)
+                    for pid, s in best]
+
+    def name_of(self, point_id: str) -> str:
+        with self.lock:
+            return self.doc_name.get(point_id, "")
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
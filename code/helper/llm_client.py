@@ -0,0 +1,377 @@
+# ---------- Shared LLM / Embedding HTTP transport (pooled, keep-alive, HTTP/2) ----------
+# deps: pip install "httpx[http2]"
+#
+# Every OpenAI-compatible call in the pipeline (config generator, prompt enhancer,
+# task manager, module generator, retriever embeddings) goes through here instead of
+# a bare `requests.post`, so TCP+TLS handshakes are paid once per process rather than
+# once per attempt.
+#
+#   post_json(url, payload, ...)         -> sync facade  (dict)
+#   await apost_json(url, payload, ...)  -> async facade (dict)
+#   chat_completion / achat_completion   -> same, consulting the on-disk response cache first
+#   stream_chat_completion(...)          -> SSE streaming with an early-stop predicate
+# The chat helpers also enforce the per-stage prompt budget and record token usage
+# (see token_budget.py); `meta` ({"module": ..., "attempt": ...}) tags the usage record.
+#
+# Each request records connect / time-to-first-byte / transfer timings (via the
+# httpcore trace hook); see `timing_summary()`.
+#
+# Every request first takes a slot from rate_limiter.py (RPM/TPM buckets, AIMD concurrency).
+# HTTP 429 responses are retried here, after the cooldown the limiter derives from Retry-After.
+
+import os, json, time, threading, asyncio, logging, weakref
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+try:
+    from helper.response_cache import cache_get, cache_put
+    from helper.token_budget import apply_token_budget, record_usage, count_tokens, count_message_tokens
+    from helper.rate_limiter import acquire, aacquire, release, bucket_for_stage, parse_retry_after
+except ImportError:  # imported from inside helper/
+    from response_cache import cache_get, cache_put
+    from token_budget import apply_token_budget, record_usage, count_tokens, count_message_tokens
+    from rate_limiter import acquire, aacquire, release, bucket_for_stage, parse_retry_after
+
+# ---- Config (env-driven) ----
+LLM_HTTP2            = os.getenv("HIVEGEN_HTTP2", "1") not in ("0", "false", "False")
+LLM_MAX_CONNECTIONS  = int(os.getenv("HIVEGEN_HTTP_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE    = int(os.getenv("HIVEGEN_HTTP_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("HIVEGEN_HTTP_KEEPALIVE_EXPIRY", "90"))
+LLM_LOG_TIMINGS      = os.getenv("HIVEGEN_HTTP_LOG_TIMINGS", "1") not in ("0", "false", "False")
+LLM_MAX_429_RETRIES  = int(os.getenv("HIVEGEN_HTTP_MAX_429_RETRIES", "6"))
+
+try:
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 when h2 is installed)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+_sync_client: Optional[httpx.Client] = None
+_sync_lock = threading.Lock()
+# one AsyncClient per event loop (pooled connections are bound to the loop that opened them)
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+_timings: deque = deque(maxlen=int(os.getenv("HIVEGEN_HTTP_TIMING_HISTORY", "2000")))
+_timings_lock = threading.Lock()
+
+
+# ---- Helpers ----
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+def _auth_headers(api_key: Optional[str]) -> Dict[str, str]:
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing OPENAI_API_KEY")
+    return {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+def get_client() -> httpx.Client:
+    """Process-wide pooled sync client (lazy)."""
+    global _sync_client
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(http2=LLM_HTTP2 and _HTTP2_AVAILABLE, limits=_limits())
+    return _sync_client
+
+def get_async_client() -> httpx.AsyncClient:
+    """Pooled async client for the running event loop (lazy)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(http2=LLM_HTTP2 and _HTTP2_AVAILABLE, limits=_limits())
+        _async_clients[loop] = client
+    return client
+
+def close_clients() -> None:
+    """Close the sync pool (async pools close with their event loop)."""
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+
+
+# ---- Timing capture ----
+class _TraceRecorder:
+    """Collects httpcore trace events into connect / ttfb / transfer timings."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, event_name: str) -> None:
+        self.marks.setdefault(event_name, time.perf_counter())
+
+    def sync_hook(self, event_name: str, info: Dict[str, Any]) -> None:
+        self.mark(event_name)
+
+    async def async_hook(self, event_name: str, info: Dict[str, Any]) -> None:
+        self.mark(event_name)
+
+    def _first(self, *suffixes: str) -> Optional[float]:
+        hits = [t for name, t in self.marks.items() if name.endswith(suffixes)]
+        return min(hits) if hits else None
+
+    def result(self) -> Dict[str, Any]:
+        t_end = time.perf_counter()
+        c0 = self._first("connect_tcp.started")
+        c1 = self._first("start_tls.complete") or self._first("connect_tcp.complete")
+        hdr = self._first("receive_response_headers.complete")
+        body = self._first("receive_response_body.complete")
+        return {
+            "reused_connection": c0 is None,
+            "connect_ms": round((c1 - c0) * 1000, 2) if (c0 is not None and c1 is not None) else 0.0,
+            "ttfb_ms": round((hdr - self.t0) * 1000, 2) if hdr is not None else None,
+            "transfer_ms": round(((body or t_end) - hdr) * 1000, 2) if hdr is not None else None,
+            "total_ms": round((t_end - self.t0) * 1000, 2),
+        }
+
+def _record(stage: str, url: str, status: Optional[int], http_version: str, t: Dict[str, Any]) -> None:
+    rec = {"stage": stage, "url": url, "status": status, "http_version": http_version, **t}
+    with _timings_lock:
+        _timings.append(rec)
+    if LLM_LOG_TIMINGS:
+        logging.info(
+            "[llm_client] stage=%s status=%s %s reused=%s connect=%.1fms ttfb=%sms transfer=%sms total=%.1fms",
+            stage, status, http_version, t["reused_connection"], t["connect_ms"],
+            t["ttfb_ms"], t["transfer_ms"], t["total_ms"],
+        )
+
+def request_timings(stage: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Raw per-request timing records (most recent last)."""
+    with _timings_lock:
+        recs = list(_timings)
+    return [r for r in recs if stage is None or r["stage"] == stage]
+
+def timing_summary() -> Dict[str, Dict[str, Any]]:
+    """Per-stage aggregates: count, new connections, mean connect/ttfb/transfer/total (ms)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in request_timings():
+        s = out.setdefault(r["stage"], {"count": 0, "new_connections": 0, "connect_ms": 0.0,
+                                        "ttfb_ms": 0.0, "transfer_ms": 0.0, "total_ms": 0.0})
+        s["count"] += 1
+        s["new_connections"] += 0 if r["reused_connection"] else 1
+        for k in ("connect_ms", "ttfb_ms", "transfer_ms", "total_ms"):
+            s[k] += float(r.get(k) or 0.0)
+    for s in out.values():
+        for k in ("connect_ms", "ttfb_ms", "transfer_ms", "total_ms"):
+            s[k] = round(s[k] / max(1, s["count"]), 2)
+    return out
+
+
+# ---- Facades ----
+def _estimate_tokens(payload: Dict[str, Any]) -> int:
+    """TPM cost as the API counts it: prompt tokens + max_tokens (chat) or input tokens (embeddings)."""
+    if "messages" in payload:
+        return count_message_tokens(payload["messages"]) + int(payload.get("max_tokens") or 0)
+    inp = payload.get("input", "")
+    return sum(count_tokens(t) for t in inp) if isinstance(inp, list) else count_tokens(str(inp))
+
+def post_json(
+    url: str,
+    payload: Dict[str, Any],
+    *,
+    api_key: Optional[str] = None,
+    timeout: float = 60,
+    stage: str = "llm",
+) -> Dict[str, Any]:
+    """POST JSON over the shared pool; raises httpx.HTTPStatusError on non-2xx (after 429 retries)."""
+    bucket, est = bucket_for_stage(stage), _estimate_tokens(payload)
+    for throttle_try in range(LLM_MAX_429_RETRIES + 1):
+        acquire(bucket, est)
+        rec = _TraceRecorder()
+        status, version, retry_after = None, "", None
+        try:
+            resp = get_client().post(
+                url, headers=_auth_headers(api_key), json=payload, timeout=timeout,
+                extensions={"trace": rec.sync_hook},
+            )
+            status, version = resp.status_code, resp.http_version
+            if status == 429 and throttle_try < LLM_MAX_429_RETRIES:
+                retry_after = parse_retry_after(resp.headers)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+        finally:
+            release(bucket, ok=status is not None and status < 400, throttled=status == 429, retry_after=retry_after)
+            _record(stage, url, status, version, rec.result())
+
+async def apost_json(
+    url: str,
+    payload: Dict[str, Any],
+    *,
+    api_key: Optional[str] = None,
+    timeout: float = 60,
+    stage: str = "llm",
+) -> Dict[str, Any]:
+    """Async variant of `post_json` (shares the per-loop pool)."""
+    bucket, est = bucket_for_stage(stage), _estimate_tokens(payload)
+    for throttle_try in range(LLM_MAX_429_RETRIES + 1):
+        await aacquire(bucket, est)
+        rec = _TraceRecorder()
+        status, version, retry_after = None, "", None
+        try:
+            resp = await get_async_client().post(
+                url, headers=_auth_headers(api_key), json=payload, timeout=timeout,
+                extensions={"trace": rec.async_hook},
+            )
+            status, version = resp.status_code, resp.http_version
+            if status == 429 and throttle_try < LLM_MAX_429_RETRIES:
+                retry_after = parse_retry_after(resp.headers)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+        finally:
+            release(bucket, ok=status is not None and status < 400, throttled=status == 429, retry_after=retry_after)
+            _record(stage, url, status, version, rec.result())
+
+def _content_of(resp_json: Dict[str, Any]) -> str:
+    try:
+        return resp_json["choices"][0]["message"]["content"] or ""
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+def chat_completion(
+    url: str,
+    payload: Dict[str, Any],
+    *,
+    api_key: Optional[str] = None,
+    timeout: float = 60,
+    stage: str = "llm",
+    use_cache: bool = True,
+    cache_read: bool = True,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    `post_json` for /chat/completions with a content-addressed response cache in front.
+    `cache_read=False` forces a fresh sample (the result is still written to the cache).
+    """
+    payload = apply_token_budget(payload, stage)
+    if use_cache and cache_read:
+        hit = cache_get(payload, stage=stage)
+        if hit is not None:
+            record_usage(stage, payload, _content_of(hit), hit.get("usage"), meta=meta, cached=True)
+            return hit
+    resp_json = post_json(url, payload, api_key=api_key, timeout=timeout, stage=stage)
+    record_usage(stage, payload, _content_of(resp_json), resp_json.get("usage"), meta=meta)
+    if use_cache:
+        cache_put(payload, resp_json, stage=stage)
+    return resp_json
+
+async def achat_completion(
+    url: str,
+    payload: Dict[str, Any],
+    *,
+    api_key: Optional[str] = None,
+    timeout: float = 60,
+    stage: str = "llm",
+    use_cache: bool = True,
+    cache_read: bool = True,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Async variant of `chat_completion`."""
+    payload = apply_token_budget(payload, stage)
+    if use_cache and cache_read:
+        hit = cache_get(payload, stage=stage)
+        if hit is not None:
+            record_usage(stage, payload, _content_of(hit), hit.get("usage"), meta=meta, cached=True)
+            return hit
+    resp_json = await apost_json(url, payload, api_key=api_key, timeout=timeout, stage=stage)
+    record_usage(stage, payload, _content_of(resp_json), resp_json.get("usage"), meta=meta)
+    if use_cache:
+        cache_put(payload, resp_json, stage=stage)
+    return resp_json
+
+
+def stream_chat_completion(
+    url: str,
+    payload: Dict[str, Any],
+    *,
+    api_key: Optional[str] = None,
+    timeout: float = 60,
+    stage: str = "llm",
+    stop_when: Optional[Callable[[str], bool]] = None,
+    use_cache: bool = True,
+    cache_read: bool = True,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Stream a chat completion (SSE) and accumulate the text as it arrives.
+    If `stop_when(text_so_far)` returns True the stream is closed immediately.
+    Returns {content, ttft_ms, stop_ms, total_ms, throttle_ms, stopped_early, cached}; the
+    timings start at the attempt that was answered, time spent in the rate limiter / 429
+    backoff before it is throttle_ms.
+    """
+    payload = apply_token_budget(payload, stage)
+    if use_cache and cache_read:
+        hit = cache_get(payload, stage=stage)
+        if hit is not None:
+            record_usage(stage, payload, _content_of(hit), hit.get("usage"), meta=meta, cached=True)
+            return {"content": _content_of(hit), "ttft_ms": 0.0, "stop_ms": 0.0, "total_ms": 0.0,
+                    "throttle_ms": 0.0, "stopped_early": False, "cached": True}
+
+    bucket, est = bucket_for_stage(stage), _estimate_tokens(payload)
+    text = ""   # running buffer (no re-join per delta)
+    usage: Optional[Dict[str, Any]] = None
+    ttft = stop = None
+    stopped_early = False
+    t_start = t0 = time.perf_counter()
+    for throttle_try in range(LLM_MAX_429_RETRIES + 1):
+        acquire(bucket, est)
+        t0 = time.perf_counter()
+        rec = _TraceRecorder()
+        status, version, retry_after = None, "", None
+        try:
+            with get_client().stream(
+                "POST", url, headers=_auth_headers(api_key),
+                json={**payload, "stream": True, "stream_options": {"include_usage": True}},
+                timeout=timeout, extensions={"trace": rec.sync_hook},
+            ) as resp:
+                status, version = resp.status_code, resp.http_version
+                if status == 429 and throttle_try < LLM_MAX_429_RETRIES:
+                    retry_after = parse_retry_after(resp.headers)
+                    continue
+                resp.raise_for_status()
+                for line in resp.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get("usage") or usage  # final chunk (only if the stream runs to the end)
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content") or ""
+                    if not delta:
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    text += delta
+                    if stop_when is not None and stop_when(text):
+                        stop = time.perf_counter() - t0
+                        stopped_early = True
+                        break  # leaving the context manager closes the stream
+            break
+        finally:
+            release(bucket, ok=status is not None and status < 400, throttled=status == 429, retry_after=retry_after)
+            _record(stage, url, status, version, rec.result())
+
+    content = text
+    total = time.perf_counter() - t0
+    record_usage(stage, payload, content, usage, meta=meta)
+    if use_cache and content:
+        cache_put(payload, {"choices": [{"message": {"role": "assistant", "content": content}}]}, stage=stage)
+    return {
+        "content": content,
+        "ttft_ms": round(ttft * 1000, 2) if ttft is not None else None,
+        "stop_ms": round((stop if stop is not None else total) * 1000, 2),
+        "total_ms": round(total * 1000, 2),
+        "throttle_ms": round((t0 - t_start) * 1000, 2),
+        "stopped_early": stopped_early,
+        "cached": False,
+    }
@@ -0,0 +1,412 @@
+# ---------- In-process vector index for the code library (NumPy, no server) ----------
+# deps: pip install numpy
+#
+# Drop-in replacement for the Qdrant collection behind code_retriever's
+# search_candidates / upsert_code_block / update_weight (HIVEGEN_VECTOR_BACKEND=local).
+# One index per collection under HIVEGEN_LOCAL_INDEX_DIR:
+#   <collection>/meta.json       -> {"dims": N}
+#   <collection>/vectors.f32     -> row-major float32 matrix of L2-normalised vectors (np.memmap)
+#   <collection>/payloads.jsonl  -> payload sidecar, an append-only op log replayed on load:
+#                                   {"op":"put","id":..,"row":..,"payload":{..}}   insert / replace
+#                                   {"op":"set","id":..,"payload":{..}}            merge keys (weight updates)
+#                                   {"op":"del","id":..}                           delete (row becomes free)
+# The log is compacted on load once it is mostly superseded entries.
+#
+# Search is one matrix-vector product over all rows, then the weight re-rank
+# (cosine * weight) is vectorised too, so no "broaden then re-rank" step is needed.
+#
+# Quantised search (HIVEGEN_VECTOR_QUANT) keeps only compact codes in RAM and leaves the
+# float32 matrix on disk:
+#   int8    <collection>/vectors.q8 + scales.f32  -> 1 byte/dim + a per-row scale (~4x smaller)
+#   binary  <collection>/vectors.b1               -> 1 bit/dim, sign of each component (~32x smaller);
+#                                                    cosine estimated as cos(pi * hamming / dims)
+# Candidates are ranked on the codes, the best top_k * HIVEGEN_QUANT_OVERSAMPLING are rescored
+# against their float32 rows (only those pages are read), and the exact cosine is returned.
+# Code files are rebuilt from vectors.f32 when missing or stale: every vector write (in any mode)
+# bumps a generation counter in vectors.gen, and codes.<mode>.json records the generation the
+# codes were written at, so rows rewritten by an unquantised run are never served from old codes.
+# helper/quant_report.py measures recall vs memory for each setting on a library.
+#
+# Env:
+#   HIVEGEN_LOCAL_INDEX_DIR=<dir>      -> default: code/cache/vector_index
+#   HIVEGEN_VECTOR_QUANT=none|int8|binary  (also applied to Qdrant collections by code_retriever)
+#   HIVEGEN_QUANT_OVERSAMPLING=4
+
+import os, json, logging, threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+LOCAL_INDEX_DIR = Path(os.getenv("HIVEGEN_LOCAL_INDEX_DIR", str(Path(__file__).resolve().parent.parent / "cache" / "vector_index")))
+VECTOR_QUANT = os.getenv("HIVEGEN_VECTOR_QUANT", "none").lower()
+QUANT_OVERSAMPLING = float(os.getenv("HIVEGEN_QUANT_OVERSAMPLING", "4"))
+QUANT_MODES = ("none", "int8", "binary")
+_CHUNK_ROWS = 8192   # rows decoded per step (bounds the float32 scratch of int8 search)
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+_indexes: Dict[str, "LocalVectorIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def _normalise(vec: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    return v / n if n > 0 else v
+
+
+def _project(payload: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    return dict(payload) if fields is None else {k: payload[k] for k in fields if k in payload}
+
+
+class LocalVectorIndex:
+    """Memory-mapped float32 matrix + JSONL payload sidecar (+ optional quantised codes) for one collection."""
+
+    def __init__(self, root: Path, dims: int, *, quant: str = VECTOR_QUANT, oversampling: float = QUANT_OVERSAMPLING):
+        if quant not in QUANT_MODES:
+            raise ValueError(f"Unknown vector quantisation {quant!r} (expected one of {QUANT_MODES})")
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.vec_path = root / "vectors.f32"
+        self.log_path = root / "payloads.jsonl"
+        self.gen_path = root / "vectors.gen"
+        meta_path = root / "meta.json"
+        if meta_path.exists():
+            stored = int(json.loads(meta_path.read_text())["dims"])
+            if stored != dims:
+                raise ValueError(f"Local index {root} has dims={stored}, expected {dims}")
+        else:
+            meta_path.write_text(json.dumps({"dims": dims}))
+        self.dims = dims
+        self.quant = quant
+        self.oversampling = max(1.0, oversampling)
+        self.lock = threading.RLock()
+        self.rows = (self.vec_path.stat().st_size // (4 * dims)) if self.vec_path.exists() else 0
+        self.row_of: Dict[str, int] = {}
+        self.id_of: Dict[int, str] = {}
+        self.payloads: Dict[str, Dict[str, Any]] = {}
+        self.free_rows: List[int] = []
+        self._mm: Optional[np.memmap] = None
+        self._weights = np.zeros(0, dtype=np.float32)   # per row; NaN = empty row
+        self._gc = np.zeros(0, dtype=bool)               # per row; flagged for GC -> excluded from search
+        self._codes: List[np.ndarray] = []               # quantised rows, see _code_files()
+        self._gen = int(self.gen_path.read_text() or 0) if self.gen_path.exists() else 0
+        self._replay()
+        self._load_codes()
+
+    # ---- persistence ----
+    def _replay(self) -> None:
+        n_ops = 0
+        if self.log_path.exists():
+            with open(self.log_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    n_ops += 1
+                    self._apply(op)
+        self._weights = np.full(self.rows, np.nan, dtype=np.float32)
+        self._gc = np.zeros(self.rows, dtype=bool)
+        for pid, row in self.row_of.items():
+            self._weights[row] = float(self.payloads[pid].get("weight", 0.5))
+            self._gc[row] = bool(self.payloads[pid].get("gc", False))
+        used = set(self.row_of.values())
+        self.free_rows = [r for r in range(self.rows) if r not in used]
+        if n_ops > 2 * len(self.row_of) + 100:
+            self._compact()
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        pid, kind = op.get("id"), op.get("op")
+        if kind == "put" and op.get("row", self.rows) < self.rows:
+            old = self.row_of.get(pid)
+            if old is not None and old != op["row"]:
+                self.id_of.pop(old, None)
+            self.row_of[pid] = op["row"]
+            self.id_of[op["row"]] = pid
+            self.payloads[pid] = op.get("payload") or {}
+        elif kind == "set" and pid in self.payloads:
+            self.payloads[pid].update(op.get("payload") or {})
+        elif kind == "del" and pid in self.row_of:
+            self.id_of.pop(self.row_of.pop(pid), None)
+            self.payloads.pop(pid, None)
+
+    def _append_ops(self, ops: List[Dict[str, Any]]) -> None:
+        with open(self.log_path, "a") as f:
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+
+    def _compact(self) -> None:
+        tmp = self.log_path.with_suffix(".jsonl.tmp")
+        with open(tmp, "w") as f:
+            for pid, row in self.row_of.items():
+                f.write(json.dumps({"op": "put", "id": pid, "row": row, "payload": self.payloads[pid]}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.log_path)
+
+    def _view(self) -> Optional[np.memmap]:
+        if self.rows == 0:
+            return None
+        if self._mm is None or self._mm.shape[0] != self.rows:
+            self._mm = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(self.rows, self.dims))
+        return self._mm
+
+    # ---- quantised codes (in RAM; float32 rows stay on disk for rescoring) ----
+    def _code_files(self) -> List[Tuple[Path, Any, int]]:
+        """(path, dtype, values per row) for each code array of the current mode."""
+        if self.quant == "int8":
+            return [(self.root / "vectors.q8", np.int8, self.dims), (self.root / "scales.f32", np.float32, 1)]
+        if self.quant == "binary":
+            return [(self.root / "vectors.b1", np.uint8, (self.dims + 7) // 8)]
+        return []
+
+    def _bump_generation(self) -> None:
+        """Called before vectors.f32 is written, so a crash mid-write also leaves the codes stale."""
+        self._gen += 1
+        self.gen_path.write_text(str(self._gen))
+
+    def _stamp_path(self) -> Path:
+        return self.root / f"codes.{self.quant}.json"
+
+    def _write_stamp(self) -> None:
+        self._stamp_path().write_text(json.dumps({"gen": self._gen, "rows": self.rows}))
+
+    def _codes_fresh(self, files: List[Tuple[Path, Any, int]]) -> bool:
+        try:
+            stamp = json.loads(self._stamp_path().read_text())
+        except (OSError, ValueError):
+            return False
+        return (stamp.get("gen") == self._gen and stamp.get("rows") == self.rows and
+                all(p.exists() and p.stat().st_size == self.rows * w * np.dtype(t).itemsize for p, t, w in files))
+
+    def _encode(self, vecs: np.ndarray) -> List[np.ndarray]:
+        if self.quant == "int8":
+            scale = np.abs(vecs).max(axis=1, keepdims=True) / 127.0
+            scale[scale == 0] = 1.0
+            return [np.round(vecs / scale).astype(np.int8), scale.astype(np.float32)]
+        return [np.packbits(vecs > 0, axis=1)]
+
+    def _load_codes(self) -> None:
+        files = self._code_files()
+        if not files:
+            return
+        if self._codes_fresh(files):
+            self._codes = [np.fromfile(p, dtype=t).reshape(self.rows, w) for p, t, w in files]
+            return
+        mm = self._view()
+        parts = [self._encode(np.asarray(mm[i:i + _CHUNK_ROWS])) for i in range(0, self.rows, _CHUNK_ROWS)]
+        self._codes = [np.concatenate([p[j] for p in parts]) if parts else np.zeros((0, w), dtype=t)
+                       for j, (_, t, w) in enumerate(files)]
+        for (p, _, _), c in zip(files, self._codes):
+            c.tofile(p)
+        self._write_stamp()
+        logging.info("[local_index] built %s codes for %d rows in %s", self.quant, self.rows, self.root)
+
+    def _store_codes(self, rows: List[int], vecs: np.ndarray) -> None:
+        files = self._code_files()
+        if not files or not rows:
+            return
+        for j, ((path, t, w), c) in enumerate(zip(files, self._encode(vecs))):
+            if len(self._codes[j]) < self.rows:
+                self._codes[j] = np.concatenate([self._codes[j], np.zeros((self.rows - len(self._codes[j]), w), dtype=t)])
+            self._codes[j][rows] = c
+            with open(path, "r+b" if path.exists() else "w+b") as f:
+                for r, row_codes in zip(rows, c):
+                    f.seek(r * w * np.dtype(t).itemsize)
+                    f.write(row_codes.tobytes())
+        self._write_stamp()
+
+    def _approx_cos(self, q: np.ndarray) -> np.ndarray:
+        """Cosine estimate for every row from the quantised codes."""
+        out = np.empty(self.rows, dtype=np.float32)
+        if self.quant == "int8":
+            codes, scale = self._codes
+            for i in range(0, self.rows, _CHUNK_ROWS):
+                out[i:i + _CHUNK_ROWS] = (codes[i:i + _CHUNK_ROWS].astype(np.float32) @ q) * scale[i:i + _CHUNK_ROWS, 0]
+        else:
+            qbits = np.packbits(q > 0)
+            for i in range(0, self.rows, _CHUNK_ROWS):
+                ham = _POPCOUNT[np.bitwise_xor(self._codes[0][i:i + _CHUNK_ROWS], qbits)].sum(axis=1)
+                out[i:i + _CHUNK_ROWS] = np.cos(np.pi * ham / self.dims)
+        return out
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Size of the float32 matrix (on disk) vs what search keeps in RAM."""
+        full = self.rows * self.dims * 4
+        codes = sum(int(c.nbytes) for c in self._codes)
+        return {"float32": full, "resident": codes if self.quant != "none" else full}
+
+    # ---- Qdrant-like operations ----
+    def upsert(self, points: Sequence[Dict[str, Any]]) -> None:
+        """points: [{"id", "vector", "payload"}]; an existing id is overwritten in place."""
+        with self.lock:
+            ops, appended, written = [], [], []
+            self._bump_generation()
+            with open(self.vec_path, "r+b" if self.vec_path.exists() else "w+b") as f:
+                for p in points:
+                    vec = _normalise(p["vector"])
+                    if vec.shape != (self.dims,):
+                        raise ValueError(f"Vector has {vec.shape[0]} dims, index expects {self.dims}")
+                    row = self.row_of.get(p["id"])
+                    if row is None:
+                        row = self.free_rows.pop() if self.free_rows else self.rows + len(appended)
+                        if row >= self.rows:
+                            appended.append(row)
+                    f.seek(row * self.dims * 4)
+                    f.write(vec.tobytes())
+                    written.append((row, vec))
+                    ops.append({"op": "put", "id": p["id"], "row": row, "payload": p.get("payload") or {}})
+                f.flush()
+                os.fsync(f.fileno())
+            # rows are on disk before the log references them (same ordering as embedding_cache)
+            self.rows += len(appended)
+            if len(self._weights) < self.rows:
+                grow = self.rows - len(self._weights)
+                self._weights = np.concatenate([self._weights, np.full(grow, np.nan, dtype=np.float32)])
+                self._gc = np.concatenate([self._gc, np.zeros(grow, dtype=bool)])
+            if written:
+                self._store_codes([r for r, _ in written], np.stack([v for _, v in written]))
+            self._append_ops(ops)
+            for op in ops:
+                self._apply(op)
+                self._weights[op["row"]] = float(op["payload"].get("weight", 0.5))
+                self._gc[op["row"]] = bool(op["payload"].get("gc", False))
+
+    def retrieve(self, ids: Sequence[str], fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Points with their payload (only `fields` if given)."""
+        with self.lock:
+            return [{"id": pid, "payload": _project(self.payloads[pid], fields)} for pid in ids if pid in self.payloads]
+
+    def set_payload(self, point_id: str, payload: Dict[str, Any]) -> None:
+        """Merge `payload` keys into the point's payload (like Qdrant set_payload)."""
+        with self.lock:
+            if point_id not in self.payloads:
+                return
+            self._append_ops([{"op": "set", "id": point_id, "payload": payload}])
+            self.payloads[point_id].update(payload)
+            if "weight" in payload:
+                self._weights[self.row_of[point_id]] = float(payload["weight"])
+            if "gc" in payload:
+                self._gc[self.row_of[point_id]] = bool(payload["gc"])
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self.lock:
+            ids = [pid for pid in ids if pid in self.row_of]
+            if not ids:
+                return 0
+            self._append_ops([{"op": "del", "id": pid} for pid in ids])
+            for pid in ids:
+                row = self.row_of[pid]
+                self._apply({"op": "del", "id": pid})
+                self._weights[row] = np.nan
+                self._gc[row] = False
+                self.free_rows.append(row)
+            return len(ids)
+
+    def search(
+        self,
+        query: Sequence[float],
+        *,
+        top_k: int = 5,
+        min_cosine: float = 0.0,
+        payload_fields: Optional[Sequence[str]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k by cosine * weight among rows with cosine >= min_cosine, skipping points
+        flagged `gc` (payload limited to `payload_fields` if given; only `ids` if given).
+        With quantisation, candidates come from the codes and are rescored in full precision.
+        """
+        return self.search_batch([query], top_k=top_k, min_cosine=min_cosine,
+                                 payload_fields=payload_fields, ids=[ids])[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[Sequence[float]],
+        *,
+        top_k: int = 5,
+        min_cosine: float = 0.0,
+        payload_fields: Optional[Sequence[str]] = None,
+        ids: Optional[Sequence[Optional[Sequence[str]]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """search() for many queries; unquantised, the matrix is read once for all of them."""
+        if not queries:
+            return []
+        qs = np.stack([_normalise(q) for q in queries])
+        ids = ids if ids is not None else [None] * len(qs)
+        with self.lock:
+            mm = self._view()
+            if mm is None:
+                return [[] for _ in qs]
+            w = self._weights[: self.rows]
+            live = ~np.isnan(w) & ~self._gc[: self.rows]
+            all_cos = (mm @ qs.T) if self.quant == "none" else None
+            out = []
+            for j, q in enumerate(qs):
+                valid = live
+                if ids[j] is not None:
+                    valid = np.zeros(self.rows, dtype=bool)
+                    valid[[self.row_of[p] for p in ids[j] if p in self.row_of]] = True
+                    valid &= live
+                if all_cos is not None:
+                    rows, cos = np.arange(self.rows), all_cos[:, j]
+                else:
+                    approx = np.where(valid, self._approx_cos(q) * np.nan_to_num(w), -np.inf)
+                    n = min(int(top_k * self.oversampling), int(valid.sum()))
+                    if n <= 0:
+                        out.append([])
+                        continue
+                    rows = np.sort(np.argpartition(-approx, n - 1)[:n])   # ascending -> sequential reads
+                    cos = np.asarray(mm[rows]) @ q
+                    valid = valid[rows]
+                out.append(self._top(rows, cos, valid, w, top_k, min_cosine, payload_fields))
+            return out
+
+    def _top(self, rows, cos, valid, w, top_k, min_cosine, payload_fields) -> List[Dict[str, Any]]:
+        score = np.where(valid & (cos >= min_cosine), cos * np.nan_to_num(w[rows]), -np.inf)
+        k = min(top_k, int(np.isfinite(score).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top])]
+        out = []
+        for i in top:
+            r = int(rows[i])
+            pid = self.id_of[r]
+            out.append({
+                "point_id": pid,
+                "cosine": float(cos[i]),
+                "weight": float(w[r]),
+                "score": float(score[i]),
+                "payload": _project(self.payloads[pid], payload_fields),
+            })
+        return out
+
+    def vector(self, point_id: str) -> Optional[List[float]]:
+        with self.lock:
+            row = self.row_of.get(point_id)
+            mm = self._view()
+            return mm[row].tolist() if (row is not None and mm is not None) else None
+
+    def scroll(self, offset: int = 0, limit: int = 256, fields: Optional[Sequence[str]] = None):
+        """Page through points in row order; returns (points, next_offset or None)."""
+        with self.lock:
+            out, row = [], offset
+            while row < self.rows and len(out) < limit:
+                pid = self.id_of.get(row)
+                if pid is not None:
+                    out.append({"id": pid, "payload": _project(self.payloads[pid], fields)})
+                row += 1
+            return out, (row if row < self.rows else None)
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+
+def local_index(collection: str, dims: int) -> LocalVectorIndex:
+    """Process-wide index for `collection` (opened lazily, shared across threads; HIVEGEN_VECTOR_QUANT applies)."""
+    with _indexes_lock:
+        idx = _indexes.get(collection)
+        if idx is None:
+            idx = _indexes[collection] = LocalVectorIndex(LOCAL_INDEX_DIR / collection, dims)
+        return idx
@@ -1,17 +1,48 @@
-import os, re, time, requests
-from typing import List, Optional, Dict
+import os, re, time, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Dict, Tuple
 import logging
 import dotenv
+try:
+    from helper.llm_client import chat_completion, stream_chat_completion
+except ImportError:  # imported from inside helper/
+    from llm_client import chat_completion, stream_chat_completion
 dotenv.load_dotenv()
 
 OPENAI_API_KEY   = os.getenv("OPENAI_API_KEY")
-OPENAI_BASE_URL  = "https://api.openai.com/v1"
-OPENAI_MODEL     = "gpt-5-chat-latest"
+OPENAI_BASE_URL  = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL     = os.getenv("OPENAI_MODEL", "gpt-5-chat-latest")
+OPENAI_STREAM    = os.getenv("HIVEGEN_LLM_STREAM", "1") not in ("0", "false", "False")
+SPECULATIVE_N    = int(os.getenv("HIVEGEN_SPECULATIVE_N", "1"))  # candidates per attempt (1 = off)
+
+# per-module streaming timings: {module, ttft_ms, endmodule_ms, total_ms, throttle_ms, stopped_early, cached}
+_generation_timings: List[Dict] = []
+
+_FENCED_MODULE_DONE_RE = re.compile(r"```(?:systemverilog|verilog)?\s*[\s\S]*?\bendmodule\b[\s\S]*?```", re.IGNORECASE)
+
+class GenerationCancelled(Exception):
+    """Raised inside a generation whose `cancel_event` was set (another candidate won)."""
 
 def _extract_code_block(content: str) -> str:
     m = re.search(r"```(?:systemverilog|verilog)?\s*([\s\S]*?)```", content, flags=re.IGNORECASE)
     return (m.group(1).strip() if m else content.strip())
 
+def _fenced_module_complete(text: str, checked: int = 0) -> bool:
+    """
+    Early-stop predicate for streaming: opening fence, `endmodule`, then the closing fence.
+    `checked`: length already known not to complete; the answer can only flip when the new
+    tail brings a backtick (the closing fence arrives last), so other deltas cost O(delta).
+    """
+    if checked and "`" not in text[max(0, checked - 2):]:
+        return False
+    if text.count("```") < 2 or "endmodule" not in text:
+        return False
+    return _FENCED_MODULE_DONE_RE.search(text) is not None
+
+def generation_timings() -> List[Dict]:
+    """Streaming timings recorded by module_generator_llm (time-to-first-token / time-to-endmodule)."""
+    return list(_generation_timings)
+
 def sv_header_from_code(code: str) -> str:
     # extract "module ... (...);" line(s) only
     import re
@@ -61,6 +92,9 @@ def module_generator_llm(
     temperature: float = 0.15,
     timeout_secs: int = 60,
     max_retries: int = 3,
+    stream: Optional[bool] = None,                    # default: HIVEGEN_LLM_STREAM
+    cancel_event: Optional[threading.Event] = None,   # set -> abort (closes the stream if streaming)
+    attempt_no: Optional[int] = None,                 # caller's validation attempt (token accounting, cache reads)
 ) -> str:
     """
     Always produce final SystemVerilog for `module_name`, adapted to `interface_sig`.
@@ -68,6 +102,8 @@ def module_generator_llm(
       - headers of already-built children (non-LLM), to improve instantiation correctness
       - retrieved reference code (if any) + its weight (confidence hint)
       - optional design facts (bitwidth, handshake, tiling)
+    With `stream`, the completion is streamed and closed as soon as `endmodule`
+    and the closing fence have arrived (the model's trailing prose is never waited on).
     """
     if not OPENAI_API_KEY:
         raise RuntimeError("Missing OPENAI_API_KEY")
@@ -125,7 +161,6 @@ def module_generator_llm(
     print("--------------------------------------------------")
 
     url = f"{OPENAI_BASE_URL}/chat/completions"
-    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
     payload = {
         "model": OPENAI_MODEL,
         "messages": [
@@ -136,15 +171,109 @@ def module_generator_llm(
         "max_tokens": 2500,
     }
 
+    checked = [0]   # prefix length already known not to complete (see _fenced_module_complete)
+
+    def _stop_when(text: str) -> bool:
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled(module_name)  # aborts the stream without caching the partial text
+        done = _fenced_module_complete(text, checked[0])
+        checked[0] = len(text)
+        return done
+
+    use_stream = OPENAI_STREAM if stream is None else stream
+    usage_meta = {"module": module_name, "attempt": attempt_no}
+    # a validation retry must resample: its prompt can equal the failed attempt's, and a cached
+    # completion would just hand the same failing code back
+    cache_read = not attempt_no or attempt_no <= 1
     last_err = None
     for attempt in range(1, max_retries + 1):
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled(module_name)
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=timeout_secs)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
+            if use_stream:
+                checked[0] = 0   # new stream
+                res = stream_chat_completion(url, payload, api_key=OPENAI_API_KEY, timeout=timeout_secs,
+                                             stage="module_generator", stop_when=_stop_when,
+                                             cache_read=cache_read, meta=usage_meta)
+                content = res["content"]
+                _generation_timings.append({
+                    "module": module_name, "ttft_ms": res["ttft_ms"], "endmodule_ms": res["stop_ms"],
+                    "total_ms": res["total_ms"], "throttle_ms": res["throttle_ms"],
+                    "stopped_early": res["stopped_early"], "cached": res["cached"],
+                })
+                logging.info("[module_generator] %s ttft=%sms endmodule=%sms throttled=%sms early_stop=%s cached=%s",
+                             module_name, res["ttft_ms"], res["stop_ms"], res["throttle_ms"], res["stopped_early"],
+                             res["cached"])
+            else:
+                resp_json = chat_completion(url, payload, api_key=OPENAI_API_KEY, timeout=timeout_secs,
+                                            stage="module_generator", cache_read=cache_read, meta=usage_meta)
+                content = resp_json["choices"][0]["message"]["content"]
             code = _extract_code_block(content)
             return code
+        except GenerationCancelled:
+            raise
         except Exception as e:
             last_err = e
             time.sleep(1.2 * attempt)
     raise RuntimeError(f"module_generator_llm failed after {max_retries} retries: {last_err}")
+
+
+def speculative_module_generation(
+    validate_fn: Callable[[str], Tuple[bool, str]],
+    *,
+    n_candidates: int = SPECULATIVE_N,
+    temperature: float = 0.15,
+    temperature_step: float = 0.1,
+    **gen_kwargs,
+) -> Tuple[str, bool, str]:
+    """
+    Speculative attempt: run `n_candidates` module_generator_llm calls in parallel and validate
+    each with `validate_fn(code) -> (ok, msg)` as soon as it lands. The first passing candidate
+    wins and the others are cancelled (streams are closed; non-streamed requests are abandoned).
+    Candidate i uses `temperature + i*temperature_step`, so candidates differ and each has its own
+    response-cache entry.
+    Returns (code, ok, msg); when none pass, code/msg come from the first candidate that failed.
+    """
+    n = max(1, n_candidates)
+    cancel = threading.Event()
+    lock = threading.Lock()
+    winner: Dict[str, object] = {}
+    first_fail: Dict[str, object] = {}
+
+    def _candidate(i: int) -> None:
+        code = module_generator_llm(temperature=temperature + i * temperature_step, cancel_event=cancel, **gen_kwargs)
+        if cancel.is_set():
+            return
+        ok, msg = validate_fn(code)
+        with lock:
+            if ok and not winner:
+                winner.update(code=code, msg=msg, idx=i)
+                cancel.set()
+            elif not ok and not first_fail:
+                first_fail.update(code=code, msg=msg)
+
+    ex = ThreadPoolExecutor(max_workers=n)
+    last_err: Optional[Exception] = None
+    try:
+        futs = [ex.submit(_candidate, i) for i in range(n)]
+        for fut in as_completed(futs):
+            try:
+                fut.result()
+            except GenerationCancelled:
+                pass
+            except Exception as e:
+                last_err = e
+                logging.warning("[module_generator] speculative candidate failed: %s", e)
+            if winner:
+                break
+    finally:
+        cancel.set()
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    name = gen_kwargs.get("module_name", "?")
+    if winner:
+        logging.info("[module_generator] %s: candidate %s/%d passed validation first", name, winner["idx"], n)
+        return str(winner["code"]), True, str(winner["msg"])
+    if first_fail:
+        return str(first_fail["code"]), False, str(first_fail["msg"])
+    raise RuntimeError(f"speculative_module_generation: all {n} candidates failed for {name}: {last_err}")
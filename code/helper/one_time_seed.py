@@ -6,7 +6,7 @@
 import json, re
 from pathlib import Path
 from typing import List, Tuple
-from code_retriever import upsert_code_block, ensure_collection, QDRANT_COLLECTION
+from code_retriever import bulk_upsert_code_blocks, ensure_collection, QDRANT_COLLECTION
 import logging
 
 # Simple SV header parser (reuses the idea from runtime parser)
@@ -49,6 +49,7 @@ def import_verilogEval_jsonl(jsonl_path: Path, *, default_weight: float = 0.5) -
     """
     count = 0
     ensure_collection()
+    entries = []  # (unique_name, description, ports, code_sv, task_id)
     with open(jsonl_path, "r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
@@ -65,19 +66,18 @@ def import_verilogEval_jsonl(jsonl_path: Path, *, default_weight: float = 0.5) -
             # Many tasks use "top_module" — make a unique library key but keep the literal module name in the code
             unique_name = f"{task_id}__{mod_name or 'module'}"
             description = f"verilogEval::{task_id} — seed entry for retrieval; prompt-derived module '{mod_name or 'module'}'."
+            entries.append((unique_name, description, ports, code_sv, task_id))
 
-            # Upsert into Qdrant (embedding built from module name + description + ports)
-            upsert_code_block(
-                module_name=unique_name,
-                description=description,
-                interface_sig=ports,
-                code_text=code_sv,
-                weight=default_weight,
-                tags=["verilogEval", task_id],
-            )
-            count += 1
+    # Batched embed + batched upserts (resumable; see bulk_upsert_code_blocks)
+    stats = bulk_upsert_code_blocks([
+        {"module_name": unique_name, "description": description, "interface_sig": ports,
+         "code_text": code_sv, "weight": default_weight, "tags": ["verilogEval", task_id]}
+        for unique_name, description, ports, code_sv, task_id in entries
+    ])
+    count = stats["written"] + stats["skipped_resumed"]
     if "logging" in globals():
-        logging.info("Imported %d verilogEval entries into Qdrant collection '%s'", count, QDRANT_COLLECTION)
+        logging.info("Imported %d verilogEval entries into Qdrant collection '%s' (%.1f points/sec)",
+                     count, QDRANT_COLLECTION, stats["points_per_sec"])
     return count
 
 
@@ -0,0 +1,376 @@
+# ---------- Local OpenAI-compatible stand-in server (offline benchmarking) ----------
+# Implements POST /chat/completions (plain + SSE streaming) and POST /embeddings, with or
+# without the /v1 prefix. Responses come from the recorded runs under code/backups/* when
+# the request can be matched, otherwise they are synthesised deterministically:
+#
+#   stage (from the system prompt) | recorded source                         | synthetic fallback
+#   config_generator               | configuration.json                      | {"synthetic": true}
+#   prompt_enhancer                | augmented_prompt.txt                    | one-module hierarchy
+#   task_manager                   | task_list.json + module_index.json +    | single top module
+#                                  | sketch/*.sv                             |
+#   module_generator/fallback_llm  | module from assembled_design.sv         | port-only module stub
+#   embeddings                     | —                                       | hashed bag-of-tokens vector
+#
+# A run is picked by token overlap between the request and the run's recorded input
+# (HIVEGEN_STANDIN_RUN=<dir name> pins one). Embeddings of similar texts are similar, so
+# retrieval behaves plausibly against a local Qdrant.
+#
+# Fault injection (CLI flags, or the env var in brackets):
+#   --latency      [HIVEGEN_STANDIN_LATENCY]      delay before the first byte, one of
+#                  fixed:MS | uniform:LO,HI | normal:MU,SD | lognormal:MEDIAN_MS,SIGMA | exp:MEAN_MS
+#   --chunk-ms     [HIVEGEN_STANDIN_CHUNK_MS]     delay between streamed chunks
+#   --p429         [HIVEGEN_STANDIN_P429]         probability of HTTP 429 (with Retry-After)
+#   --retry-after  [HIVEGEN_STANDIN_RETRY_AFTER]  seconds advertised in Retry-After
+#   --ptimeout     [HIVEGEN_STANDIN_PTIMEOUT]     probability of hanging for --hang-secs, then closing
+#   --seed         [HIVEGEN_STANDIN_SEED]         RNG seed for latency/fault draws
+#
+# Usage:
+#   python helper/openai_standin.py --port 8001 --latency lognormal:800,0.5 --p429 0.05
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=local python demo.py
+
+import os, re, json, time, math, random, hashlib, argparse, threading, logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKUPS_DIR = Path(__file__).resolve().parent.parent / "backups"
+DEFAULT_EMB_DIMS = 1536
+
+_MODULE_RE = re.compile(r"(?ms)^\s*module\s+([A-Za-z_]\w*)\b.*?^\s*endmodule\b")
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+
+
+def _tokens(text: str) -> List[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(text)]
+
+def _overlap(a: str, b: str) -> float:
+    sa, sb = set(_tokens(a)), set(_tokens(b))
+    return len(sa & sb) / (len(sa | sb) or 1)
+
+
+# ---- Recorded runs ----
+class _Run:
+    """Artifacts of one recorded pipeline run (any subset may be missing)."""
+
+    def __init__(self, root: Path):
+        self.name = root.relative_to(BACKUPS_DIR).as_posix()
+        self.root = root
+        read = lambda fn: (root / fn).read_text() if (root / fn).exists() else None
+        self.configuration = read("configuration.json")
+        self.system_prompt = read("system_prompt.txt")
+        self.augmented_prompt = read("augmented_prompt.txt")
+        self.task_list = read("task_list.json")
+        self.module_index = read("module_index.json")
+        self.modules: Dict[str, str] = {}
+        design = read("assembled_design.sv")
+        if design:
+            for m in _MODULE_RE.finditer(design):
+                self.modules.setdefault(m.group(1).lower(), m.group(0).strip())
+
+    def task_manager_json(self) -> Optional[Dict[str, Any]]:
+        """Rebuild the task-manager response (the inverse of what demo.py writes to disk)."""
+        if not (self.task_list and self.module_index):
+            return None
+        tl, mi = json.loads(self.task_list), json.loads(self.module_index)
+        modules = []
+        for name, info in mi.get("modules", {}).items():
+            fn = Path(info.get("filename", "")).name or f"{name.lower()}.sv"
+            sketch = self.root / "sketch" / fn
+            modules.append({
+                "name": name,
+                "hier": info.get("hier_level", 0),
+                "description": info.get("description", ""),
+                "children": info.get("children", []),
+                "filename": fn,
+                "language": info.get("language", "systemverilog"),
+                "code": sketch.read_text() if sketch.exists() else f"module {name} ();\n/* body block */\nendmodule\n",
+            })
+        return {"top": mi.get("top") or tl.get("top"), "modules": modules, "task_order": tl.get("task_order", [])}
+
+
+def _load_runs(root: Path = BACKUPS_DIR) -> List[_Run]:
+    runs = []
+    if root.exists():
+        for marker in sorted(root.rglob("*")):
+            if marker.name in ("augmented_prompt.txt", "assembled_design.sv", "configuration.json"):
+                if not any(r.root == marker.parent for r in runs):
+                    runs.append(_Run(marker.parent))
+    return runs
+
+
+# ---- Response synthesis ----
+def _classify(messages: List[Dict[str, Any]]) -> str:
+    system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+    if "Task Manager" in system:
+        return "task_manager"
+    if "expert chip architect" in system:
+        return "prompt_enhancer"
+    if "exactly ONE module" in system or "Verilog code only" in system:
+        return "module_generator"
+    if "```json" in system:
+        return "config_generator"
+    return "generic"
+
+def _requested_module(user: str) -> Tuple[str, List[str]]:
+    m = re.search(r"Target module name:\s*(\w+)", user) or re.search(r"code for module '(\w+)'", user)
+    p = re.search(r"(?:Required ports \(names must match\)|Ports):\s*(.*)", user)
+    ports = [x.strip() for x in p.group(1).split(",") if re.fullmatch(r"\s*\w+\s*", x)] if p else []
+    return (m.group(1) if m else "synthetic_module"), ports
+
+def _synthetic_module(name: str, ports: List[str]) -> str:
+    decl = ",\n".join(f"    inout wire {p}" for p in ports)
+    return f"module {name} (\n{decl}\n);\nendmodule" if ports else f"module {name};\nendmodule"
+
+
+class StandinBackend:
+    """Maps a chat request to recorded or synthetic content; holds no network state."""
+
+    def __init__(self, runs: Optional[List[_Run]] = None, pin: Optional[str] = None):
+        self.runs = _load_runs() if runs is None else runs
+        self.pin = pin if pin is not None else os.getenv("HIVEGEN_STANDIN_RUN")
+        self.stats = {"recorded": 0, "synthetic": 0}
+        self.lock = threading.Lock()
+
+    def _best_run(self, text: str, attr: str) -> Optional[_Run]:
+        cands = [r for r in self.runs if getattr(r, attr)]
+        if self.pin:
+            cands = [r for r in cands if r.name == self.pin or r.name.startswith(self.pin + "/")] or cands
+        return max(cands, key=lambda r: _overlap(text, getattr(r, attr)), default=None)
+
+    def chat(self, payload: Dict[str, Any]) -> Tuple[str, str]:
+        """Return (content, source) for a chat payload."""
+        messages = payload.get("messages") or []
+        user = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+        stage = _classify(messages)
+        content = None
+
+        if stage == "config_generator":
+            run = self._best_run(user, "system_prompt") or self._best_run(user, "configuration")
+            if run and run.configuration:
+                content = f"```json\n{run.configuration.strip()}\n```"
+            fallback = '```json\n{"synthetic": true}\n```'
+        elif stage == "prompt_enhancer":
+            run = self._best_run(user, "configuration")
+            content = run.augmented_prompt.strip() if run and run.augmented_prompt else None
+            fallback = "Top module (Hier 0)\nDescription: Synthetic design produced by the local stand-in server."
+        elif stage == "task_manager":
+            run = self._best_run(user, "augmented_prompt")
+            tm = run.task_manager_json() if run else None
+            content = f"```json\n{json.dumps(tm, indent=2)}\n```" if tm else None
+            top = {"name": "synthetic_top", "hier": 0, "description": "", "children": [],
+                   "filename": "synthetic_top.sv", "language": "systemverilog",
+                   "code": "module synthetic_top (input logic clk, input logic rst_n);\n/* body block */\nendmodule\n"}
+            fallback = f"```json\n{json.dumps({'top': 'synthetic_top', 'modules': [top], 'task_order': ['synthetic_top']})}\n```"
+        elif stage == "module_generator":
+            name, ports = _requested_module(user)
+            for run in ([self._best_run(user, "modules")] if self.pin else []) + self.runs:
+                if run and name.lower() in run.modules:
+                    content = f"```systemverilog\n{run.modules[name.lower()]}\n```"
+                    break
+            fallback = f"```systemverilog\n{_synthetic_module(name, ports)}\n```"
+        else:
+            fallback = "OK"
+
+        with self.lock:
+            self.stats["recorded" if content is not None else "synthetic"] += 1
+        return (content, "recorded") if content is not None else (fallback, "synthetic")
+
+    @staticmethod
+    def embedding(text: str, dims: int = DEFAULT_EMB_DIMS) -> List[float]:
+        """Deterministic hashed bag-of-tokens (+ bigrams), L2-normalised."""
+        vec = [0.0] * dims
+        toks = _tokens(text)
+        for feat in toks + [a + " " + b for a, b in zip(toks, toks[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % dims] += 1.0 if (h >> 63) & 1 else -1.0
+        if not toks:
+            vec[0] = 1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+
+# ---- Fault injection ----
+class FaultModel:
+    """Latency distribution + 429/timeout probabilities (one seeded RNG, thread-safe)."""
+
+    def __init__(self, latency: str = "fixed:0", chunk_ms: float = 0.0, p429: float = 0.0,
+                 retry_after: float = 1.0, ptimeout: float = 0.0, hang_secs: float = 120.0,
+                 seed: Optional[int] = None):
+        kind, _, args = latency.partition(":")
+        self.kind = kind.strip().lower()
+        self.args = [float(a) for a in args.split(",") if a.strip()] or [0.0]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution: {latency!r}")
+        self.chunk_ms, self.p429, self.retry_after = chunk_ms, p429, retry_after
+        self.ptimeout, self.hang_secs = ptimeout, hang_secs
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def latency_secs(self) -> float:
+        a = self.args
+        with self.lock:
+            if self.kind == "fixed":
+                ms = a[0]
+            elif self.kind == "uniform":
+                ms = self.rng.uniform(a[0], a[1] if len(a) > 1 else a[0])
+            elif self.kind == "normal":
+                ms = self.rng.gauss(a[0], a[1] if len(a) > 1 else 0.0)
+            elif self.kind == "lognormal":
+                ms = a[0] * math.exp(self.rng.gauss(0.0, a[1] if len(a) > 1 else 0.5))
+            else:
+                ms = self.rng.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+        return max(0.0, ms) / 1000.0
+
+    def draw_fault(self) -> Optional[str]:
+        with self.lock:
+            r = self.rng.random()
+        if r < self.p429:
+            return "429"
+        if r < self.p429 + self.ptimeout:
+            return "timeout"
+        return None
+
+
+# ---- HTTP layer ----
+def _make_handler(backend: StandinBackend, faults: FaultModel):
+    counters = {"requests": 0, "429": 0, "timeout": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def log_message(self, fmt, *args):
+            logging.debug("[standin] " + fmt, *args)
+
+        def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with lock:
+                    snap = dict(counters)
+                return self._send_json(200, {**snap, **backend.stats})
+            self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": {"message": "invalid JSON"}})
+            path = self.path.split("?")[0].rstrip("/")
+            with lock:
+                counters["requests"] += 1
+
+            fault = faults.draw_fault()
+            if fault == "429":
+                with lock:
+                    counters["429"] += 1
+                return self._send_json(429, {"error": {"message": "Rate limit reached (stand-in)", "type": "requests"}},
+                                       {"Retry-After": f"{faults.retry_after:g}",
+                                        "retry-after-ms": str(int(faults.retry_after * 1000))})
+            if fault == "timeout":
+                with lock:
+                    counters["timeout"] += 1
+                time.sleep(faults.hang_secs)
+                self.close_connection = True
+                return
+            time.sleep(faults.latency_secs())
+
+            if path.endswith("/embeddings"):
+                return self._embeddings(payload)
+            if path.endswith("/chat/completions"):
+                return self._chat(payload)
+            self._send_json(404, {"error": {"message": f"unknown endpoint {self.path}"}})
+
+        def _embeddings(self, payload: Dict[str, Any]):
+            inp = payload.get("input", "")
+            texts = inp if isinstance(inp, list) else [inp]
+            dims = int(payload.get("dimensions") or DEFAULT_EMB_DIMS)
+            data = [{"object": "embedding", "index": i, "embedding": backend.embedding(str(t), dims)}
+                    for i, t in enumerate(texts)]
+            n_tok = sum(len(_tokens(str(t))) for t in texts)
+            self._send_json(200, {"object": "list", "data": data, "model": payload.get("model", "standin"),
+                                  "usage": {"prompt_tokens": n_tok, "total_tokens": n_tok}})
+
+        def _chat(self, payload: Dict[str, Any]):
+            content, source = backend.chat(payload)
+            prompt_t = sum(len(str(m.get("content", ""))) // 4 + 4 for m in payload.get("messages") or []) + 2
+            usage = {"prompt_tokens": prompt_t, "completion_tokens": len(content) // 4 + 1,
+                     "total_tokens": prompt_t + len(content) // 4 + 1}
+            cid = "chatcmpl-standin-" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+            model = payload.get("model", "standin")
+            if not payload.get("stream"):
+                return self._send_json(200, {
+                    "id": cid, "object": "chat.completion", "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                }, {"X-Standin-Source": source})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("X-Standin-Source", source)
+            self.send_header("Connection", "close")  # SSE body is delimited by connection close
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for i in range(0, len(content), 16):
+                    chunk = {"id": cid, "object": "chat.completion.chunk", "model": model,
+                             "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if faults.chunk_ms:
+                        time.sleep(faults.chunk_ms / 1000.0)
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    tail = {"id": cid, "object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}
+                    self.wfile.write(f"data: {json.dumps(tail)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client stopped early (e.g. at `endmodule`)
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8001, *, faults: Optional[FaultModel] = None,
+          backend: Optional[StandinBackend] = None) -> ThreadingHTTPServer:
+    """Start the stand-in server on a daemon thread and return it (call .shutdown() to stop)."""
+    backend = backend or StandinBackend()
+    faults = faults or FaultModel()
+    httpd = ThreadingHTTPServer((host, port), _make_handler(backend, faults))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    logging.info("[standin] serving on http://%s:%d/v1 (%d recorded runs)", host, httpd.server_address[1], len(backend.runs))
+    return httpd
+
+
+if __name__ == "__main__":
+    env = os.getenv
+    ap = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server")
+    ap.add_argument("--host", default=env("HIVEGEN_STANDIN_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(env("HIVEGEN_STANDIN_PORT", "8001")))
+    ap.add_argument("--latency", default=env("HIVEGEN_STANDIN_LATENCY", "fixed:0"))
+    ap.add_argument("--chunk-ms", type=float, default=float(env("HIVEGEN_STANDIN_CHUNK_MS", "0")))
+    ap.add_argument("--p429", type=float, default=float(env("HIVEGEN_STANDIN_P429", "0")))
+    ap.add_argument("--retry-after", type=float, default=float(env("HIVEGEN_STANDIN_RETRY_AFTER", "1")))
+    ap.add_argument("--ptimeout", type=float, default=float(env("HIVEGEN_STANDIN_PTIMEOUT", "0")))
+    ap.add_argument("--hang-secs", type=float, default=float(env("HIVEGEN_STANDIN_HANG_SECS", "120")))
+    ap.add_argument("--seed", type=int, default=int(env("HIVEGEN_STANDIN_SEED", "0")))
+    ap.add_argument("--run", default=env("HIVEGEN_STANDIN_RUN"), help="pin a recorded run (dir under backups/)")
+    a = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    srv = serve(a.host, a.port,
+                faults=FaultModel(a.latency, a.chunk_ms, a.p429, a.retry_after, a.ptimeout, a.hang_secs, a.seed),
+                backend=StandinBackend(pin=a.run))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
@@ -0,0 +1,90 @@
+# ---------- Recall vs memory of quantised vector search (local index) ----------
+# Compares search_candidates-style retrieval (cosine * weight, top-k) on the quantised codes
+# (HIVEGEN_VECTOR_QUANT=int8|binary, rescored in full precision) against exact float32 search
+# on the same library, for a range of oversampling factors.
+#
+# Queries are library vectors perturbed with Gaussian noise (--noise), which stands in for
+# "same module, differently worded description"; recall@k = |quantised top-k ∩ exact top-k| / k.
+# Memory is what search keeps resident: the float32 matrix vs the codes.
+#
+# Usage (library in the local index, e.g. seeded with HIVEGEN_VECTOR_BACKEND=local):
+#   python helper/quant_report.py --collection hivegen_code_lib --queries 500 --top-k 5
+#   python helper/quant_report.py --oversampling 1,2,4,8 --json cache/quant_report.json
+
+import os, sys, json, time, argparse
+from pathlib import Path
+import numpy as np
+try:
+    from helper.local_index import LocalVectorIndex, LOCAL_INDEX_DIR
+except ImportError:  # run as helper/quant_report.py
+    from local_index import LocalVectorIndex, LOCAL_INDEX_DIR
+
+
+def _mb(n: int) -> float:
+    return n / (1024 * 1024)
+
+def run_report(root: Path, *, queries: int = 500, top_k: int = 5, noise: float = 0.05,
+               oversampling=(1.0, 2.0, 4.0, 8.0), seed: int = 0):
+    dims = int(json.loads((root / "meta.json").read_text())["dims"])
+    exact = LocalVectorIndex(root, dims, quant="none")
+    if len(exact) == 0:
+        raise SystemExit(f"[quant_report] {root} is empty")
+    rng = np.random.default_rng(seed)
+    pids = list(exact.row_of)
+    sample = rng.choice(len(pids), size=min(queries, len(pids)), replace=False)
+    qs = []
+    for i in sample:
+        v = np.asarray(exact.vector(pids[int(i)]), dtype=np.float32)
+        qs.append(v + rng.normal(0.0, noise / np.sqrt(dims), dims).astype(np.float32))
+
+    t0 = time.perf_counter()
+    truth = [{c["point_id"] for c in exact.search(q, top_k=top_k)} for q in qs]
+    base_ms = 1000 * (time.perf_counter() - t0) / len(qs)
+    full = exact.memory_bytes()["float32"]
+    rows = [{"mode": "none", "oversampling": None, "recall": 1.0, "ms_per_query": base_ms,
+             "resident_bytes": full, "bytes_per_vector": full / max(1, exact.rows)}]
+
+    for mode in ("int8", "binary"):
+        idx = LocalVectorIndex(root, dims, quant=mode)
+        mem = idx.memory_bytes()["resident"]
+        for os_ in oversampling:
+            idx.oversampling = max(1.0, os_)
+            t0 = time.perf_counter()
+            hits = [{c["point_id"] for c in idx.search(q, top_k=top_k)} for q in qs]
+            ms = 1000 * (time.perf_counter() - t0) / len(qs)
+            recall = float(np.mean([len(h & t) / max(1, len(t)) for h, t in zip(hits, truth)]))
+            rows.append({"mode": mode, "oversampling": os_, "recall": recall, "ms_per_query": ms,
+                         "resident_bytes": mem, "bytes_per_vector": mem / max(1, idx.rows)})
+    return {"collection": root.name, "points": len(exact), "dims": dims, "queries": len(qs),
+            "top_k": top_k, "noise": noise, "rows": rows}
+
+def print_report(rep) -> None:
+    print(f"[quant_report] {rep['collection']}: {rep['points']} points x {rep['dims']} dims, "
+          f"{rep['queries']} queries, recall@{rep['top_k']}, noise={rep['noise']}")
+    print(f"{'mode':<8}{'oversample':>11}{'recall':>9}{'ms/query':>10}{'resident MB':>13}{'B/vector':>10}{'GB per 1M':>11}")
+    for r in rep["rows"]:
+        os_ = "-" if r["oversampling"] is None else f"{r['oversampling']:g}x"
+        print(f"{r['mode']:<8}{os_:>11}{r['recall']:>9.3f}{r['ms_per_query']:>10.2f}"
+              f"{_mb(r['resident_bytes']):>13.1f}{r['bytes_per_vector']:>10.0f}{r['bytes_per_vector'] * 1e6 / 1e9:>11.2f}")
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Recall vs memory for quantised local-index search")
+    ap.add_argument("--collection", default=os.getenv("QDRANT_COLLECTION", "hivegen_code_lib"))
+    ap.add_argument("--index-dir", default=str(LOCAL_INDEX_DIR))
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--noise", type=float, default=0.05, help="query perturbation (relative L2 norm)")
+    ap.add_argument("--oversampling", default="1,2,4,8")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="also write the report here")
+    a = ap.parse_args(argv)
+    rep = run_report(Path(a.index_dir) / a.collection, queries=a.queries, top_k=a.top_k, noise=a.noise,
+                     oversampling=[float(x) for x in a.oversampling.split(",") if x], seed=a.seed)
+    print_report(rep)
+    if a.json:
+        Path(a.json).write_text(json.dumps(rep, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,167 @@
+# ---------- Rate-limit-aware request scheduler (token buckets + AIMD concurrency) ----------
+# One limiter per API bucket ("chat", "embedding"). Every request made by llm_client
+# acquires a slot first:
+#   - requests-per-minute and tokens-per-minute token buckets (continuous refill)
+#   - a concurrency window that grows by +1 after each full window of successes
+#     and halves on every 429 (additive increase / multiplicative decrease)
+#   - a shared cooldown set from `Retry-After` (or exponential backoff if absent),
+#     so one throttled call pauses its whole bucket instead of every caller hammering the API
+#
+# Env (defaults are conservative tier-1-ish numbers; raise them for your account):
+#   HIVEGEN_RATE_CHAT_RPM=500         HIVEGEN_RATE_CHAT_TPM=200000
+#   HIVEGEN_RATE_EMB_RPM=3000         HIVEGEN_RATE_EMB_TPM=1000000
+#   HIVEGEN_RATE_CONCURRENCY_INIT=4   HIVEGEN_RATE_CONCURRENCY_MAX=32
+#   HIVEGEN_RATE_LIMIT=0              -> disable (no waiting at all)
+
+import os, time, asyncio, threading, logging
+from typing import Dict, Optional, Tuple
+
+RATE_LIMIT_ENABLED = os.getenv("HIVEGEN_RATE_LIMIT", "1") not in ("0", "false", "False")
+_CONC_INIT = int(os.getenv("HIVEGEN_RATE_CONCURRENCY_INIT", "4"))
+_CONC_MAX  = int(os.getenv("HIVEGEN_RATE_CONCURRENCY_MAX", "32"))
+_LIMITS = {
+    "chat":      (float(os.getenv("HIVEGEN_RATE_CHAT_RPM", "500")),  float(os.getenv("HIVEGEN_RATE_CHAT_TPM", "200000"))),
+    "embedding": (float(os.getenv("HIVEGEN_RATE_EMB_RPM", "3000")),  float(os.getenv("HIVEGEN_RATE_EMB_TPM", "1000000"))),
+}
+
+
+class _BucketLimiter:
+    """RPM/TPM token buckets + AIMD concurrency window + Retry-After cooldown."""
+
+    def __init__(self, name: str, rpm: float, tpm: float):
+        self.name = name
+        self.rpm, self.tpm = rpm, tpm
+        self.req_tokens, self.tok_tokens = rpm, tpm
+        self.last_refill = time.monotonic()
+        self.limit = max(1, min(_CONC_INIT, _CONC_MAX))
+        self.in_flight = 0
+        self.successes = 0
+        self.cooldown_until = 0.0
+        self.consecutive_throttles = 0
+        self.stats = {"requests": 0, "throttled": 0, "waited_secs": 0.0}
+        self.cond = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        dt = now - self.last_refill
+        self.last_refill = now
+        self.req_tokens = min(self.rpm, self.req_tokens + dt * self.rpm / 60.0)
+        self.tok_tokens = min(self.tpm, self.tok_tokens + dt * self.tpm / 60.0)
+
+    def try_acquire(self, est_tokens: int) -> Tuple[bool, float]:
+        """Non-blocking; returns (acquired, seconds to wait before trying again). Caller holds cond."""
+        now = time.monotonic()
+        self._refill(now)
+        need_tok = min(float(est_tokens), self.tpm)  # a single huge request must still be admissible
+        if now < self.cooldown_until:
+            return False, self.cooldown_until - now
+        if self.in_flight >= self.limit:
+            return False, 0.05
+        if self.req_tokens < 1.0:
+            return False, (1.0 - self.req_tokens) * 60.0 / self.rpm
+        if self.tok_tokens < need_tok:
+            return False, (need_tok - self.tok_tokens) * 60.0 / self.tpm
+        self.req_tokens -= 1.0
+        self.tok_tokens -= need_tok
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        return True, 0.0
+
+    def release(self, *, ok: bool, throttled: bool, retry_after: Optional[float]) -> None:
+        with self.cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if throttled:
+                self.stats["throttled"] += 1
+                self.consecutive_throttles += 1
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                backoff = retry_after if retry_after is not None else min(60.0, 2.0 ** self.consecutive_throttles)
+                self.cooldown_until = max(self.cooldown_until, time.monotonic() + backoff)
+                logging.warning("[rate_limiter] %s throttled: concurrency -> %d, cooling down %.1fs",
+                                self.name, self.limit, backoff)
+            elif ok:
+                self.consecutive_throttles = 0
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < _CONC_MAX:
+                    self.limit += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+
+_limiters: Dict[str, _BucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def _limiter(bucket: str) -> _BucketLimiter:
+    with _limiters_lock:
+        lim = _limiters.get(bucket)
+        if lim is None:
+            rpm, tpm = _LIMITS.get(bucket, _LIMITS["chat"])
+            lim = _limiters[bucket] = _BucketLimiter(bucket, rpm, tpm)
+        return lim
+
+def bucket_for_stage(stage: str) -> str:
+    return "embedding" if stage == "embedding" else "chat"
+
+
+# ---- Public API ----
+def acquire(bucket: str, est_tokens: int) -> None:
+    """Block until a request slot (and `est_tokens` of TPM budget) is available."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    lim = _limiter(bucket)
+    t0 = time.monotonic()
+    with lim.cond:
+        while True:
+            ok, wait = lim.try_acquire(est_tokens)
+            if ok:
+                break
+            lim.cond.wait(timeout=min(max(wait, 0.01), 5.0))
+        lim.stats["waited_secs"] += time.monotonic() - t0
+
+async def aacquire(bucket: str, est_tokens: int) -> None:
+    """Async variant of `acquire` (polls without blocking the event loop)."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    lim = _limiter(bucket)
+    t0 = time.monotonic()
+    while True:
+        with lim.cond:
+            ok, wait = lim.try_acquire(est_tokens)
+        if ok:
+            break
+        await asyncio.sleep(min(max(wait, 0.01), 5.0))
+    with lim.cond:
+        lim.stats["waited_secs"] += time.monotonic() - t0
+
+def release(bucket: str, *, ok: bool = True, throttled: bool = False, retry_after: Optional[float] = None) -> None:
+    """
+    Return the slot. Successful (`ok`) calls grow the concurrency window;
+    `throttled=True` (HTTP 429) halves it and starts a cooldown.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    _limiter(bucket).release(ok=ok, throttled=throttled, retry_after=retry_after)
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds from `Retry-After` / `retry-after-ms` headers (None if absent/unparseable)."""
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    ra = headers.get("retry-after")
+    if ra:
+        try:
+            return float(ra)
+        except ValueError:
+            return None
+    return None
+
+def rate_limiter_stats() -> Dict[str, Dict[str, float]]:
+    out = {}
+    with _limiters_lock:
+        lims = list(_limiters.values())
+    for lim in lims:
+        with lim.cond:
+            out[lim.name] = {**lim.stats, "concurrency_limit": lim.limit, "in_flight": lim.in_flight}
+    return out
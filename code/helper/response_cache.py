@@ -0,0 +1,122 @@
+# ---------- Content-addressed on-disk cache for chat-completion responses ----------
+# Key   = sha256 of canonical JSON (model, messages, temperature, max_tokens, top_p, n, stop,
+#         response_format)
+# Store = single SQLite file (stdlib), LRU-evicted by total body size, entries expire after a TTL.
+#
+# Env:
+#   HIVEGEN_LLM_CACHE=0                 -> disable entirely
+#   HIVEGEN_LLM_CACHE_DIR=<dir>         -> location of llm_cache.sqlite (default: code/cache)
+#   HIVEGEN_LLM_CACHE_MAX_MB=256        -> size bound (LRU eviction above this)
+#   HIVEGEN_LLM_CACHE_TTL_SECS=604800   -> entries older than this are misses (0 = no TTL)
+#   HIVEGEN_LLM_CACHE_BYPASS=module_generator,task_manager
+#                                       -> per-stage bypass (no read, no write)
+
+import os, json, time, hashlib, sqlite3, threading, logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CACHE_ENABLED   = os.getenv("HIVEGEN_LLM_CACHE", "1") not in ("0", "false", "False")
+CACHE_DIR       = Path(os.getenv("HIVEGEN_LLM_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "cache")))
+CACHE_MAX_BYTES = int(float(os.getenv("HIVEGEN_LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+CACHE_TTL_SECS  = float(os.getenv("HIVEGEN_LLM_CACHE_TTL_SECS", str(7 * 24 * 3600)))
+CACHE_BYPASS    = {s.strip() for s in os.getenv("HIVEGEN_LLM_CACHE_BYPASS", "").split(",") if s.strip()}
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+# ---- Helpers ----
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Hash of the fields that determine the completion; everything else is ignored."""
+    keyed = {
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+        "top_p": payload.get("top_p"),
+        "n": payload.get("n"),
+        "stop": payload.get("stop"),
+        "response_format": payload.get("response_format"),
+    }
+    blob = json.dumps(keyed, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def cache_enabled_for(stage: str) -> bool:
+    return CACHE_ENABLED and stage not in CACHE_BYPASS
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(CACHE_DIR / "llm_cache.sqlite"), check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, stage TEXT, created REAL, last_access REAL, size INTEGER, body TEXT)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        _conn.commit()
+    return _conn
+
+def _bump(stage: str, field: str) -> None:
+    s = _stats.setdefault(stage, {"hits": 0, "misses": 0, "writes": 0, "evictions": 0})
+    s[field] += 1
+
+
+# ---- Public API ----
+def cache_get(payload: Dict[str, Any], *, stage: str) -> Optional[Dict[str, Any]]:
+    """Return the cached response JSON or None (miss / expired / bypassed)."""
+    if not cache_enabled_for(stage):
+        return None
+    key = cache_key(payload)
+    now = time.time()
+    with _lock:
+        db = _db()
+        row = db.execute("SELECT created, body FROM responses WHERE key=?", (key,)).fetchone()
+        if row and CACHE_TTL_SECS > 0 and now - row[0] > CACHE_TTL_SECS:
+            db.execute("DELETE FROM responses WHERE key=?", (key,))
+            db.commit()
+            row = None
+        if not row:
+            _bump(stage, "misses")
+            return None
+        db.execute("UPDATE responses SET last_access=? WHERE key=?", (now, key))
+        db.commit()
+        _bump(stage, "hits")
+    logging.info("[response_cache] HIT stage=%s key=%s", stage, key[:12])
+    return json.loads(row[1])
+
+def cache_put(payload: Dict[str, Any], response: Dict[str, Any], *, stage: str) -> None:
+    """Store a successful response, then evict least-recently-used entries above the size bound."""
+    if not cache_enabled_for(stage):
+        return
+    key = cache_key(payload)
+    body = json.dumps(response, ensure_ascii=False)
+    now = time.time()
+    with _lock:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO responses(key, stage, created, last_access, size, body) VALUES (?,?,?,?,?,?)",
+            (key, stage, now, now, len(body.encode("utf-8")), body),
+        )
+        _bump(stage, "writes")
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > CACHE_MAX_BYTES:
+            victim = db.execute("SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 1").fetchone()
+            if not victim or victim[0] == key:
+                break
+            db.execute("DELETE FROM responses WHERE key=?", (victim[0],))
+            total -= victim[1]
+            _bump(stage, "evictions")
+        db.commit()
+
+def cache_clear() -> None:
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM responses")
+        db.commit()
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Per-stage hits / misses / writes / evictions for this process."""
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
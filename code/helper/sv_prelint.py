@@ -0,0 +1,182 @@
+# ---------- Structural pre-lint for generated SystemVerilog (no subprocess) ----------
+# Cheap single-pass checks run on LLM output before iverilog is spawned. A candidate that
+# fails them can't compile (or can't be instantiated by its parent), so its diagnostics go
+# straight back into the retry feedback and the compile is skipped:
+#   fence        leftover ``` markdown fences
+#   module       no `module <name>` for the requested module
+#   endmodule    a module without `endmodule`
+#   balance      begin/end, case/endcase, fork/join, function/task/generate blocks and
+#                parentheses out of balance (with line numbers); bodiless prototypes
+#                (DPI import/export, extern, pure virtual) don't open a block
+#   ports        header ports differ from the interface_sig the prompt asked for
+# Comments and string literals are skipped; checks stay conservative (a false reject costs
+# an LLM retry).
+#
+# Report over recorded runs (backups/*/module_index.json + sketch/ + assembled_design.sv):
+#   python helper/sv_prelint.py [--root backups]
+#
+# Env:
+#   HIVEGEN_PRELINT=1   -> 0 disables the pre-lint in the demos
+
+import os, re, sys, json, argparse, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+try:
+    from helper.interface_fingerprint import parse_ports
+except ImportError:  # imported from inside helper/
+    from interface_fingerprint import parse_ports
+
+PRELINT_ENABLED = os.getenv("HIVEGEN_PRELINT", "1") not in ("0", "false", "False")
+
+_TOKEN_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"'                     # skipped: comments, strings
+    r'|(?:(?P<pre>\bwait\s+|\bdisable\s+|\b(?:import|export)\s+"DPI(?:-C)?"\s+(?:(?:context|pure)\s+)?(?:\w+\s*=\s*)?'
+    r'|\bextern\s+(?:(?:static|protected|local|virtual|forkjoin)\s+)*|\bpure\s+virtual\s+(?:(?:static|protected|local)\s+)*))?'
+    r'\b(?P<kw>module|macromodule|endmodule|begin|end|fork|join|join_any|join_none'
+    r'|case|casez|casex|randcase|endcase|function|endfunction|task|endtask|generate|endgenerate)\b'
+    r'|(?P<paren>[()])', re.S)
+_OPENERS = {"module": "endmodule", "macromodule": "endmodule", "begin": "end", "fork": "join",
+            "case": "endcase", "casez": "endcase", "casex": "endcase", "randcase": "endcase",
+            "function": "endfunction", "task": "endtask", "generate": "endgenerate"}
+_MODULE_NAME_RE = re.compile(r'\b(?:module|macromodule)\s+(?:automatic\s+|static\s+)?([A-Za-z_]\w*)')
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"checked": 0, "rejected": 0}
+_rule_counts: Dict[str, int] = {}
+
+
+def _strip(code: str) -> str:
+    """Comments and strings blanked out (newlines kept, so line numbers stay valid)."""
+    def blank(m):
+        return re.sub(r'[^\n]', ' ', m.group(0))
+    return re.sub(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"', blank, code, flags=re.S)
+
+def _balance(code: str) -> List[Tuple[str, str]]:
+    diags, stack, parens = [], [], []
+    line, pos = 1, 0
+    for m in _TOKEN_RE.finditer(code):
+        line += code.count("\n", pos, m.start())
+        pos = m.start()
+        kw, paren = m.group("kw"), m.group("paren")
+        if paren == "(":
+            parens.append(line)
+        elif paren == ")":
+            if parens:
+                parens.pop()
+            else:
+                diags.append(("balance", f"line {line}: unmatched ')'"))
+        elif kw is None or m.group("pre"):
+            pass   # comment / string / `wait fork;` / `disable fork;` / DPI, extern and pure virtual prototypes
+        elif kw in _OPENERS:
+            stack.append((kw, line))
+        elif kw == "endmodule" and any(o in ("module", "macromodule") for o, _ in stack):
+            while stack[-1][0] not in ("module", "macromodule"):
+                o, ln = stack.pop()
+                diags.append(("balance", f"line {ln}: '{o}' is not closed before 'endmodule' (line {line})"))
+            stack.pop()
+        elif stack and _OPENERS[stack[-1][0]] == ("join" if kw.startswith("join") else kw):
+            stack.pop()
+        else:
+            opener = f"'{stack[-1][0]}' from line {stack[-1][1]} is still open" if stack else "nothing is open"
+            diags.append(("balance", f"line {line}: unexpected '{kw}' ({opener})"))
+    for o, ln in stack:
+        if o in ("module", "macromodule"):
+            diags.append(("endmodule", f"line {ln}: module is never closed (missing 'endmodule')"))
+        else:
+            diags.append(("balance", f"line {ln}: '{o}' is never closed"))
+    if parens:
+        diags.append(("balance", f"line {parens[-1]}: '(' is never closed ({len(parens)} unmatched)"))
+    return diags
+
+def prelint(code: str, module_name: str = "", interface_sig: Optional[Sequence[str]] = None) -> List[Tuple[str, str]]:
+    """[(rule, message)] for structural defects; [] = looks compilable, go on to iverilog."""
+    diags: List[Tuple[str, str]] = []
+    if "```" in code:
+        diags.append(("fence", "markdown code fence (```) left in the source"))
+    stripped = _strip(code)
+    names = _MODULE_NAME_RE.findall(stripped)
+    if not names:
+        diags.append(("module", "no module declaration found"))
+    elif module_name and module_name not in names:
+        diags.append(("module", f"expected 'module {module_name}', found: {', '.join(names)}"))
+    diags += _balance(code)
+    if module_name in names and interface_sig:
+        # header of the requested module only
+        start = re.search(rf'\b(?:module|macromodule)\s+(?:automatic\s+|static\s+)?{re.escape(module_name)}\b', stripped).start()
+        _, ports = parse_ports(stripped[start:])
+        got, want = [p for p, _, _ in ports], list(interface_sig)
+        missing = [p for p in want if p not in got]
+        extra = [p for p in got if p not in want]
+        if missing:
+            diags.append(("ports", f"ports missing from the header of {module_name}: {', '.join(missing)}"))
+        if extra:
+            diags.append(("ports", f"ports not in the required interface of {module_name}: {', '.join(extra)}"))
+    return diags
+
+def format_prelint(diags: List[Tuple[str, str]]) -> str:
+    """Compiler-style text for the retry feedback."""
+    return "\n".join(f"pre-lint error [{rule}]: {msg}" for rule, msg in diags)
+
+def check_candidate(code: str, module_name: str = "", interface_sig: Optional[Sequence[str]] = None) -> Tuple[bool, str]:
+    """(ok, diagnostics) like the compile functions; counted in prelint_stats()."""
+    diags = prelint(code, module_name, interface_sig)
+    with _stats_lock:
+        _stats["checked"] += 1
+        if diags:
+            _stats["rejected"] += 1
+            for rule in {r for r, _ in diags}:
+                _rule_counts[rule] = _rule_counts.get(rule, 0) + 1
+    return (not diags), format_prelint(diags)
+
+def prelint_stats() -> Dict[str, object]:
+    """Each rejection is one iverilog run (and its temp files) that did not happen."""
+    with _stats_lock:
+        return {**_stats, "iverilog_runs_saved": _stats["rejected"], "by_rule": dict(_rule_counts)}
+
+
+# ---- report over recorded runs ----
+def _split_assembled(text: str) -> Dict[str, str]:
+    parts = re.split(r'(?m)^// ---- (\w+) ----\s*$', text)
+    return {parts[i]: parts[i + 1] for i in range(1, len(parts) - 1, 2)}
+
+def report(root: Path) -> Dict[str, object]:
+    runs = []
+    for idx_path in sorted(root.rglob("module_index.json")):
+        run_dir = idx_path.parent
+        mods = json.loads(idx_path.read_text())["modules"]
+        assembled = run_dir / "assembled_design.sv"
+        bodies = _split_assembled(assembled.read_text()) if assembled.exists() else {}
+        checked, rejected, details = 0, 0, []
+        for name, info in mods.items():
+            sketch = run_dir / "sketch" / Path(info.get("filename", "")).name
+            want = [p for p, _, _ in parse_ports(sketch.read_text())[1]] if sketch.exists() else []
+            for kind, code in (("sketch", sketch.read_text() if sketch.exists() else None), ("assembled", bodies.get(name))):
+                if code is None:
+                    continue
+                checked += 1
+                diags = prelint(code, name, want)
+                if diags:
+                    rejected += 1
+                    details.append({"module": name, "source": kind, "diagnostics": [m for _, m in diags]})
+        runs.append({"run": str(run_dir.relative_to(root)), "candidates": checked, "rejected": rejected, "details": details})
+    total = sum(r["candidates"] for r in runs)
+    saved = sum(r["rejected"] for r in runs)
+    return {"runs": runs, "candidates": total, "iverilog_runs_saved": saved}
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Pre-lint the module sources of recorded runs")
+    ap.add_argument("--root", default=str(Path(__file__).resolve().parent.parent / "backups"))
+    ap.add_argument("--json", help="also write the report here")
+    a = ap.parse_args(argv)
+    rep = report(Path(a.root))
+    for r in rep["runs"]:
+        print(f"[sv_prelint] {r['run']}: {r['candidates']} candidates, {r['rejected']} rejected")
+        for d in r["details"]:
+            print(f"    {d['module']} ({d['source']}): " + "; ".join(d["diagnostics"]))
+    print(f"[sv_prelint] total: {rep['candidates']} candidates, iverilog runs saved: {rep['iverilog_runs_saved']}")
+    if a.json:
+        Path(a.json).write_text(json.dumps(rep, indent=2))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+# ---------- Token accounting + per-stage prompt budgets ----------
+# Records prompt/completion tokens for every chat call (per stage, per module, per attempt),
+# taken from the API `usage` field, or estimated locally when it is missing
+# (cache hits, early-stopped streams, servers that omit usage).
+#
+# Budgets cap the *prompt* size per stage. A prompt over budget is shrunk in this order,
+# stopping as soon as it fits:
+#   1) compact embedded JSON   (indent=2 dumps -> separators=(",", ":"))
+#   2) drop line indentation   (outside ``` code fences)
+#   3) truncate error context  (```text fences, e.g. compiler output fed back on retry)
+#
+# Env:
+#   HIVEGEN_TOKEN_BUDGETS="config_generator=6000,prompt_enhancer=6000,module_generator=3000"
+#
+# deps (optional): pip install tiktoken   (falls back to ~4 chars/token)
+
+import os, re, json, copy, threading, logging
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TOKEN_BUDGETS: Dict[str, int] = {}
+for _kv in os.getenv("HIVEGEN_TOKEN_BUDGETS", "").split(","):
+    if "=" in _kv:
+        _k, _v = _kv.split("=", 1)
+        TOKEN_BUDGETS[_k.strip()] = int(_v)
+
+_MSG_OVERHEAD = 4  # per-message framing tokens in the chat format
+_encoder = None   # None = not loaded yet, False = fall back to the estimate
+_usage: List[Dict[str, Any]] = []
+_usage_lock = threading.Lock()
+
+
+# ---- Counting ----
+def _load_encoder():
+    """tiktoken encoder, or False when it can't be loaded (e.g. offline with no cached BPE file)."""
+    for name in ("o200k_base", "cl100k_base"):
+        try:
+            return tiktoken.get_encoding(name)
+        except Exception as e:
+            err = e
+    logging.warning("[token_budget] tiktoken encodings unavailable (%s); estimating ~4 chars/token", err)
+    return False
+
+def count_tokens(text: str) -> int:
+    global _encoder
+    if tiktoken is not None and _encoder is None:
+        _encoder = _load_encoder()
+    if _encoder:
+        return len(_encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(count_tokens(str(m.get("content", ""))) + _MSG_OVERHEAD for m in messages) + 2
+
+
+# ---- Budget enforcement ----
+_FENCE_RE = re.compile(r"```[\s\S]*?```")
+_TEXT_FENCE_RE = re.compile(r"(```text\n)([\s\S]*?)(\n```)")
+
+def _compact_json_blocks(text: str) -> str:
+    """Re-serialize every embedded JSON object/array (that starts a line) without whitespace."""
+    dec = json.JSONDecoder()
+    out, i, n = [], 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "{[" and not text[text.rfind("\n", 0, i) + 1:i].strip():  # only whitespace before it on the line
+            try:
+                obj, end = dec.raw_decode(text, i)
+                if end - i > 40:
+                    out.append(json.dumps(obj, separators=(",", ":"), ensure_ascii=False))
+                    i = end
+                    continue
+            except ValueError:
+                pass
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+def _drop_indentation(text: str) -> str:
+    """Strip leading whitespace on every line that is not inside a ``` fence."""
+    parts, last = [], 0
+    for m in _FENCE_RE.finditer(text):
+        parts.append(re.sub(r"(?m)^[ \t]+", "", text[last:m.start()]))
+        parts.append(m.group(0))
+        last = m.end()
+    parts.append(re.sub(r"(?m)^[ \t]+", "", text[last:]))
+    return "".join(parts)
+
+def _truncate_error_context(text: str, excess_tokens: int) -> str:
+    """Shorten ```text fences (compiler output) by roughly `excess_tokens`, keeping the head."""
+    def _cut(m):
+        nonlocal excess_tokens
+        body = m.group(2)
+        if excess_tokens <= 0:
+            return m.group(0)
+        drop_chars = min(len(body), excess_tokens * 4 + 16)
+        excess_tokens -= drop_chars // 4
+        kept = body[: len(body) - drop_chars]
+        return m.group(1) + kept + ("\n...[truncated]" if drop_chars else "") + m.group(3)
+    return _TEXT_FENCE_RE.sub(_cut, text)
+
+def apply_token_budget(payload: Dict[str, Any], stage: str, budget: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Return `payload` unchanged if its messages fit the stage budget, else a copy with
+    shrunk message contents. Never raises; logs if the prompt still does not fit.
+    """
+    budget = budget if budget is not None else TOKEN_BUDGETS.get(stage)
+    messages = payload.get("messages") or []
+    if not budget or not messages:
+        return payload
+    before = count_message_tokens(messages)
+    if before <= budget:
+        return payload
+
+    out = copy.deepcopy(payload)
+    msgs = out["messages"]
+    steps = []
+    for name, fn in (("compact_json", _compact_json_blocks), ("drop_indent", _drop_indentation)):
+        for m in msgs:
+            if isinstance(m.get("content"), str):
+                m["content"] = fn(m["content"])
+        steps.append(name)
+        if count_message_tokens(msgs) <= budget:
+            break
+    now = count_message_tokens(msgs)
+    if now > budget:
+        for m in reversed(msgs):  # error feedback lives in the user turn
+            if isinstance(m.get("content"), str) and "```text" in m["content"]:
+                m["content"] = _truncate_error_context(m["content"], now - budget)
+                steps.append("truncate_errors")
+                now = count_message_tokens(msgs)
+                if now <= budget:
+                    break
+    logging.info("[token_budget] stage=%s prompt %d -> %d tokens (budget %d) via %s",
+                 stage, before, now, budget, "+".join(steps))
+    if now > budget:
+        logging.warning("[token_budget] stage=%s still over budget after compaction (%d > %d)", stage, now, budget)
+    return out
+
+
+# ---- Accounting ----
+def record_usage(
+    stage: str,
+    payload: Dict[str, Any],
+    completion_text: str,
+    usage: Optional[Dict[str, Any]] = None,
+    *,
+    meta: Optional[Dict[str, Any]] = None,
+    cached: bool = False,
+) -> Dict[str, Any]:
+    """Store one call's token counts (API `usage` if given, else local estimate)."""
+    if usage and "prompt_tokens" in usage:
+        prompt_t, compl_t, source = int(usage["prompt_tokens"]), int(usage.get("completion_tokens", 0)), "api"
+    else:
+        prompt_t = count_message_tokens(payload.get("messages") or [])
+        compl_t = count_tokens(completion_text or "")
+        source = "estimate"
+    rec = {
+        "stage": stage,
+        "module": (meta or {}).get("module"),
+        "attempt": (meta or {}).get("attempt"),
+        "prompt_tokens": prompt_t,
+        "completion_tokens": compl_t,
+        "source": source,
+        "cached": cached,
+    }
+    with _usage_lock:
+        _usage.append(rec)
+    return rec
+
+def usage_records() -> List[Dict[str, Any]]:
+    with _usage_lock:
+        return list(_usage)
+
+def usage_report() -> Dict[str, Any]:
+    """Totals per stage and per (stage, module); cached calls are counted separately (not billed)."""
+    by_stage: Dict[str, Dict[str, int]] = {}
+    by_module: Dict[str, Dict[str, int]] = {}
+    for r in usage_records():
+        for bucket, key in ((by_stage, r["stage"]), (by_module, f"{r['stage']}:{r['module']}" if r["module"] else None)):
+            if key is None:
+                continue
+            b = bucket.setdefault(key, {"calls": 0, "cached_calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            if r["cached"]:
+                b["cached_calls"] += 1
+                continue
+            b["calls"] += 1
+            b["prompt_tokens"] += r["prompt_tokens"]
+            b["completion_tokens"] += r["completion_tokens"]
+    return {"by_stage": by_stage, "by_module": by_module}
@@ -0,0 +1,116 @@
+# ---------- Persistent cache of syntax-check results ----------
+# The same sources get compiled over and over: retrieved library code on every run, LLM
+# retries that return byte-identical text, reruns over known-good modules. iverilog is
+# deterministic for a given input, so a result is reused when everything that decides it
+# is unchanged:
+# Key   = sha256 of (sorted (module name, dedented source) pairs, tool, tool version, flags)
+# Value = (ok, diagnostics)
+# Store = single SQLite file (stdlib), LRU-evicted by total size, like response_cache.
+# Timeouts are never stored.
+#
+# Env:
+#   HIVEGEN_VALIDATION_CACHE=0              -> disable
+#   HIVEGEN_VALIDATION_CACHE_DIR=<dir>      -> location of validation_cache.sqlite (default: code/cache)
+#   HIVEGEN_VALIDATION_CACHE_MAX_MB=64
+
+import os, json, time, hashlib, sqlite3, textwrap, threading, subprocess
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+VCACHE_ENABLED   = os.getenv("HIVEGEN_VALIDATION_CACHE", "1") not in ("0", "false", "False")
+VCACHE_DIR       = Path(os.getenv("HIVEGEN_VALIDATION_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "cache")))
+VCACHE_MAX_BYTES = int(float(os.getenv("HIVEGEN_VALIDATION_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+_versions: Dict[str, str] = {}
+
+
+# ---- Helpers ----
+def tool_version(tool: str) -> str:
+    """First line of `<tool> -V` (memoised per process)."""
+    v = _versions.get(tool)
+    if v is None:
+        try:
+            proc = subprocess.run([tool, "-V"], capture_output=True, text=True, timeout=10)
+            v = ((proc.stdout or proc.stderr).strip().splitlines() or ["unknown"])[0]
+        except (OSError, subprocess.SubprocessError):
+            v = "unknown"
+        _versions[tool] = v
+    return v
+
+def validation_key(named_sources: Dict[str, str], cmd: Sequence[str]) -> str:
+    keyed = {
+        "sources": sorted((mn, textwrap.dedent(code)) for mn, code in named_sources.items()),
+        "tool": cmd[0],
+        "version": tool_version(cmd[0]),
+        "flags": list(cmd[1:]),
+    }
+    blob = json.dumps(keyed, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        VCACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(VCACHE_DIR / "validation_cache.sqlite"), check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, kind TEXT, created REAL, last_access REAL, size INTEGER, ok INTEGER, msg TEXT)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results(last_access)")
+        _conn.commit()
+    return _conn
+
+def _bump(kind: str, field: str) -> None:
+    s = _stats.setdefault(kind, {"hits": 0, "misses": 0, "writes": 0, "evictions": 0})
+    s[field] += 1
+
+
+# ---- Public API ----
+def vcache_get(key: str, *, kind: str) -> Optional[Tuple[bool, str]]:
+    """(ok, diagnostics) of an earlier identical check, or None."""
+    if not VCACHE_ENABLED:
+        return None
+    with _lock:
+        db = _db()
+        row = db.execute("SELECT ok, msg FROM results WHERE key=?", (key,)).fetchone()
+        if not row:
+            _bump(kind, "misses")
+            return None
+        db.execute("UPDATE results SET last_access=? WHERE key=?", (time.time(), key))
+        db.commit()
+        _bump(kind, "hits")
+    return bool(row[0]), row[1]
+
+def vcache_put(key: str, ok: bool, msg: str, *, kind: str) -> None:
+    """Store a result, then evict least-recently-used entries above the size bound."""
+    if not VCACHE_ENABLED:
+        return
+    now = time.time()
+    with _lock:
+        db = _db()
+        db.execute(
+            "INSERT OR REPLACE INTO results(key, kind, created, last_access, size, ok, msg) VALUES (?,?,?,?,?,?,?)",
+            (key, kind, now, now, len(msg.encode("utf-8")) + 100, int(ok), msg),
+        )
+        _bump(kind, "writes")
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > VCACHE_MAX_BYTES:
+            victim = db.execute("SELECT key, size FROM results ORDER BY last_access ASC LIMIT 1").fetchone()
+            if not victim or victim[0] == key:
+                break
+            db.execute("DELETE FROM results WHERE key=?", (victim[0],))
+            total -= victim[1]
+            _bump(kind, "evictions")
+        db.commit()
+
+def vcache_stats() -> Dict[str, Dict[str, float]]:
+    """Per-kind (unit / bundle) hits, misses, writes, evictions and hit rate for this process."""
+    with _lock:
+        out = {}
+        for k, v in _stats.items():
+            n = v["hits"] + v["misses"]
+            out[k] = {**v, "hit_rate": round(v["hits"] / n, 3) if n else 0.0}
+        return out
@@ -0,0 +1,240 @@
+# ---------- Validation service (iverilog syntax checks on a process pool) ----------
+# compile_sv_syntax_only / compile_bundle_syntax_only used to create a TemporaryDirectory,
+# write every file and run iverilog synchronously for each attempt. Here:
+#   - jobs go to a pool of worker processes and come back as Futures, so checks from
+#     concurrently built modules (and speculative candidates) run side by side on all cores
+#     while other threads wait on the LLM;
+#   - each worker keeps one scratch directory for its lifetime; a source is stored as
+#     <module>_<hash>.sv and only written when that content is new to the worker, so
+#     accepted modules / child stubs that every attempt includes are written once
+#     (least recently used files are dropped past HIVEGEN_VALIDATION_MAX_FILES);
+#   - if a worker dies (OOM, killed), the pool is rebuilt once and the job resubmitted; if that
+#     fails too, the job is compiled in the calling thread instead of failing the build;
+#   - results are looked up in / stored to helper/validation_cache.py first, so a bundle
+#     that was already checked (this run or an earlier one) never reaches a worker.
+#
+# Env:
+#   HIVEGEN_VALIDATION_WORKERS=<n>        -> default min(4, cpu count)
+#   HIVEGEN_VALIDATION_WORKDIR=<dir>      -> default <tmp>/hivegen_validate (one subdir per worker)
+#   HIVEGEN_VALIDATION_TIMEOUT_SECS=60    HIVEGEN_VALIDATION_MAX_FILES=512
+
+import os, time, shutil, hashlib, tempfile, textwrap, threading, subprocess, logging
+import multiprocessing as mp
+import multiprocessing.util
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+try:
+    from helper.validation_cache import validation_key, vcache_get, vcache_put
+except ImportError:  # imported from inside helper/
+    from validation_cache import validation_key, vcache_get, vcache_put
+
+VALIDATION_WORKERS = int(os.getenv("HIVEGEN_VALIDATION_WORKERS", str(min(4, os.cpu_count() or 1))))
+VALIDATION_WORKDIR = Path(os.getenv("HIVEGEN_VALIDATION_WORKDIR", str(Path(tempfile.gettempdir()) / "hivegen_validate")))
+VALIDATION_TIMEOUT = float(os.getenv("HIVEGEN_VALIDATION_TIMEOUT_SECS", "60"))
+VALIDATION_MAX_FILES = int(os.getenv("HIVEGEN_VALIDATION_MAX_FILES", "512"))
+IVERILOG_CMD = ["iverilog", "-g2012", "-tnull"]   # -g2012: SystemVerilog; -tnull: syntax only
+
+# ---- worker side (state lives in each worker process) ----
+_ws_dir: Optional[Path] = None
+_ws_files: "OrderedDict[str, Path]" = OrderedDict()   # file name -> path, least recently used first
+
+
+def _init_worker(root: str) -> None:
+    global _ws_dir
+    _ws_dir = Path(root) / f"w{os.getpid()}"
+    shutil.rmtree(_ws_dir, ignore_errors=True)
+    _ws_dir.mkdir(parents=True, exist_ok=True)
+    mp.util.Finalize(None, shutil.rmtree, args=(str(_ws_dir),), kwargs={"ignore_errors": True}, exitpriority=10)
+
+def _materialise(name: str, code: str) -> Tuple[Path, bool]:
+    """Path of `code` in the workspace; True if it had to be written."""
+    text = textwrap.dedent(code)
+    fname = f"{name}_{hashlib.sha1(text.encode()).hexdigest()[:16]}.sv"
+    p = _ws_files.get(fname)
+    if p is not None:
+        _ws_files.move_to_end(fname)
+        return p, False
+    p = _ws_dir / fname
+    p.write_text(text)
+    _ws_files[fname] = p
+    while len(_ws_files) > VALIDATION_MAX_FILES:
+        _, old = _ws_files.popitem(last=False)
+        old.unlink(missing_ok=True)
+    return p, True
+
+def _compile_job(named_sources: Dict[str, str], timeout: float) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    paths, written = [], 0
+    for mn, code in named_sources.items():
+        p, new = _materialise(mn, code)
+        paths.append(str(p))
+        written += new
+    timed_out = False
+    try:
+        proc = subprocess.run([*IVERILOG_CMD, *paths], capture_output=True, text=True, timeout=timeout)
+        ok, msg = proc.returncode == 0, (proc.stdout or "") + (proc.stderr or "")
+    except subprocess.TimeoutExpired:
+        ok, msg, timed_out = False, f"iverilog timed out after {timeout:.0f}s", True
+    # workspace paths -> module names, so diagnostics read like the old temp-dir ones
+    for mn, p in zip(named_sources, paths):
+        msg = msg.replace(p, f"{mn}.sv")
+    return {"ok": ok, "msg": msg, "timed_out": timed_out, "written": written, "reused": len(paths) - written,
+            "secs": time.perf_counter() - t0}
+
+
+# ---- caller side ----
+class ValidationService:
+    """Process pool running iverilog syntax checks; submit() returns a Future[(ok, msg)]."""
+
+    def __init__(self, max_workers: int = VALIDATION_WORKERS, workdir: Path = VALIDATION_WORKDIR):
+        workdir.mkdir(parents=True, exist_ok=True)
+        self.max_workers, self.workdir = max(1, max_workers), workdir
+        self.pool = self._new_pool()
+        self.lock = threading.Lock()
+        self.stats = {"jobs": 0, "cached": 0, "failed": 0, "files_written": 0, "files_reused": 0, "compile_secs": 0.0,
+                      "pool_restarts": 0, "inline_jobs": 0}
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(str(self.workdir),))
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self.lock:
+            if self.pool is not broken:   # another job already replaced it
+                return
+            self.pool = self._new_pool()
+            self.stats["pool_restarts"] += 1
+        # no broken.shutdown(): this can run on the broken executor's own thread, which
+        # already terminates its workers and fails their futures
+        logging.warning("[validation_service] a worker died; restarted the pool")
+
+    def _compile_inline(self, named_sources: Dict[str, str]) -> Dict[str, Any]:
+        """Last resort when the pool can't run a job: the old temp-dir compile, in this thread."""
+        t0 = time.perf_counter()
+        with self.lock:
+            self.stats["inline_jobs"] += 1
+        with tempfile.TemporaryDirectory() as td:
+            paths = []
+            for mn, code in named_sources.items():
+                p = Path(td) / f"{mn}.sv"
+                p.write_text(textwrap.dedent(code))
+                paths.append(str(p))
+            timed_out = False
+            try:
+                proc = subprocess.run([*IVERILOG_CMD, *paths], capture_output=True, text=True, timeout=VALIDATION_TIMEOUT)
+                ok, msg = proc.returncode == 0, ((proc.stdout or "") + (proc.stderr or "")).replace(td + os.sep, "")
+            except subprocess.TimeoutExpired:
+                ok, msg, timed_out = False, f"iverilog timed out after {VALIDATION_TIMEOUT:.0f}s", True
+        return {"ok": ok, "msg": msg, "timed_out": timed_out, "written": len(paths), "reused": 0,
+                "secs": time.perf_counter() - t0}
+
+    def submit(self, named_sources: Dict[str, str], *, kind: str = "bundle") -> "Future[Tuple[bool, str]]":
+        """
+        named_sources: {module_name: code_text}, compiled together so instantiations resolve.
+        `kind` ("unit" / "bundle") only labels the cache statistics.
+        """
+        out: Future = Future()
+        if shutil.which(IVERILOG_CMD[0]) is None:
+            out.set_result((True, "iverilog not found; treating as PASS"))
+            return out
+        key = validation_key(named_sources, IVERILOG_CMD)
+        try:
+            hit = vcache_get(key, kind=kind)
+        except Exception as e:   # e.g. "database is locked": compile for real
+            logging.warning("[validation_service] validation cache read failed: %s", e)
+            hit = None
+        if hit is not None:
+            with self.lock:
+                self.stats["cached"] += 1
+            out.set_result(hit)
+            return out
+        self._dispatch(dict(named_sources), out, key, kind)
+        return out
+
+    def _dispatch(self, named_sources: Dict[str, str], out: Future, key: str, kind: str, retry: bool = True) -> None:
+        """Run the job on the pool; a broken pool is rebuilt once, after that the job runs inline."""
+        pool = self.pool
+        try:
+            job = pool.submit(_compile_job, named_sources, VALIDATION_TIMEOUT)
+        except BrokenProcessPool as e:
+            if retry:
+                self._restart_pool(pool)
+                return self._dispatch(named_sources, out, key, kind, retry=False)
+            logging.warning("[validation_service] pool unavailable (%s); compiling in-process", e)
+            return self._run_inline(named_sources, out, key, kind)
+
+        def _done(f: Future) -> None:
+            try:
+                r = f.result()
+            except BrokenProcessPool:   # a worker died while this job was queued / running
+                if retry:
+                    self._restart_pool(pool)
+                    self._dispatch(named_sources, out, key, kind, retry=False)
+                else:   # not on the executor's thread: the compile can take a while
+                    threading.Thread(target=self._run_inline, args=(named_sources, out, key, kind), daemon=True).start()
+                return
+            except Exception as e:
+                out.set_exception(e)
+                return
+            self._finish(r, out, key, kind)
+
+        job.add_done_callback(_done)
+
+    def _run_inline(self, named_sources: Dict[str, str], out: Future, key: str, kind: str) -> None:
+        try:
+            r = self._compile_inline(named_sources)
+        except Exception as e:
+            out.set_exception(e)
+            return
+        self._finish(r, out, key, kind)
+
+    def _finish(self, r: Dict[str, Any], out: Future, key: str, kind: str) -> None:
+        with self.lock:
+            self.stats["jobs"] += 1
+            self.stats["failed"] += not r["ok"]
+            self.stats["files_written"] += r["written"]
+            self.stats["files_reused"] += r["reused"]
+            self.stats["compile_secs"] += r["secs"]
+        out.set_result((r["ok"], r["msg"]))   # before the cache write, which must not leave `out` pending
+        if not r.get("timed_out"):
+            try:
+                vcache_put(key, r["ok"], r["msg"], kind=kind)
+            except Exception as e:
+                logging.warning("[validation_service] validation cache write failed: %s", e)
+
+    def shutdown(self) -> Dict[str, Any]:
+        self.pool.shutdown(wait=True)
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            s = dict(self.stats)
+        s["avg_compile_secs"] = round(s["compile_secs"] / s["jobs"], 4) if s["jobs"] else 0.0
+        s["compile_secs"] = round(s["compile_secs"], 3)
+        return s
+
+
+_service: Optional[ValidationService] = None
+_service_lock = threading.Lock()
+
+def validation_service() -> ValidationService:
+    """Process-wide service (workers start on first use)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ValidationService()
+            logging.info("[validation_service] %d workers, workspace %s", VALIDATION_WORKERS, VALIDATION_WORKDIR)
+        return _service
+
+def submit_validation(named_sources: Dict[str, str], *, kind: str = "bundle") -> "Future[Tuple[bool, str]]":
+    return validation_service().submit(named_sources, kind=kind)
+
+def stop_validation_service() -> Dict[str, Any]:
+    """Shut the workers down and return the service stats ({} if it was never used)."""
+    global _service
+    with _service_lock:
+        svc, _service = _service, None
+    return svc.shutdown() if svc is not None else {}
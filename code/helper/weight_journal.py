@@ -0,0 +1,139 @@
+# ---------- Write-behind journal for reinforcement (weight) updates ----------
+# update_weight() used to do retrieve + set_payload per call; with retrieve_or_llm_generate's
+# optimistic update plus the post-validation update that is four round trips per hit.
+# Instead, every reinforcement event is:
+#   1) appended to a local JSONL journal (durable before update_weight returns), and
+#   2) queued in memory per point.
+# A background timer (and the end of the run) flushes the queue through `apply_fn`, which
+# reads all touched points in one call, replays their events in order with the unchanged
+# weight rules, and writes them back in one batch — N events on K points cost 2 round trips.
+#
+# Each event carries a monotonically increasing `seq`; apply_fn stores the last applied seq in
+# the payload (`journal_seq`) and skips older events, so replaying the journal after a crash
+# mid-flush never applies an event twice.
+#
+# Files (under HIVEGEN_WEIGHT_JOURNAL_DIR, default code/cache):
+#   weight_journal.jsonl           -> events not yet handed to a flush
+#   weight_journal.jsonl.flushing  -> events of the flush in progress (replayed on start if present)
+
+import os, json, time, atexit, threading, logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+Event = Dict[str, Any]   # {"seq", "point_id", "success", "second_chance_given", "ts"}
+
+
+class WeightJournal:
+    """Append-only event journal + per-point coalescing queue + periodic flusher."""
+
+    def __init__(self, path: Path, apply_fn: Callable[[Dict[str, List[Event]]], None], *, interval_secs: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flushing_path = self.path.with_name(self.path.name + ".flushing")
+        self.apply_fn = apply_fn
+        self.interval = interval_secs
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()    # one flush at a time
+        self.pending: Dict[str, List[Event]] = {}
+        self.stats = {"events": 0, "flushes": 0, "points_flushed": 0, "events_flushed": 0, "flush_errors": 0, "replayed": 0}
+        self._seq = time.time_ns()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._replay()
+
+    def _replay(self) -> None:
+        for p in (self.flushing_path, self.path):
+            if not p.exists():
+                continue
+            for line in p.read_text().splitlines():
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                self.pending.setdefault(ev["point_id"], []).append(ev)
+                self._seq = max(self._seq, int(ev["seq"]))
+                self.stats["replayed"] += 1
+        if self.stats["replayed"]:
+            logging.info("[weight_journal] replaying %d unflushed events for %d points",
+                         self.stats["replayed"], len(self.pending))
+
+    def record(self, point_id: str, *, success: bool, second_chance_given: bool = False, ts: str = "") -> None:
+        with self.lock:
+            self._seq += 1
+            ev = {"seq": self._seq, "point_id": point_id, "success": bool(success),
+                  "second_chance_given": bool(second_chance_given), "ts": ts}
+            with open(self.path, "a") as f:
+                f.write(json.dumps(ev) + "\n")
+            self.pending.setdefault(point_id, []).append(ev)
+            self.stats["events"] += 1
+        self._ensure_timer()
+
+    def flush(self) -> int:
+        """Apply all queued events now; returns the number of points written."""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                batch, self.pending = self.pending, {}
+                # hand the journal over to this flush; new events start a fresh file
+                if self.path.exists():
+                    if self.flushing_path.exists():
+                        with open(self.flushing_path, "a") as dst:
+                            dst.write(self.path.read_text())
+                        self.path.unlink()
+                    else:
+                        os.replace(self.path, self.flushing_path)
+            try:
+                self.apply_fn(batch)
+            except Exception as e:
+                with self.lock:
+                    for pid, evs in batch.items():  # keep order: failed batch before newer events
+                        self.pending[pid] = evs + self.pending.get(pid, [])
+                    self.stats["flush_errors"] += 1
+                logging.warning("[weight_journal] flush of %d points failed (will retry): %s", len(batch), e)
+                return 0
+            if self.flushing_path.exists():
+                self.flushing_path.unlink()
+            with self.lock:
+                self.stats["flushes"] += 1
+                self.stats["points_flushed"] += len(batch)
+                self.stats["events_flushed"] += sum(len(v) for v in batch.values())
+            return len(batch)
+
+    def _ensure_timer(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="weight-journal", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {**self.stats, "pending_points": len(self.pending),
+                    "pending_events": sum(len(v) for v in self.pending.values())}
+
+
+_journals: List[WeightJournal] = []
+
+def open_journal(path: Path, apply_fn: Callable[[Dict[str, List[Event]]], None], *, interval_secs: float = 5.0) -> WeightJournal:
+    """Create a journal that is flushed one last time at interpreter exit."""
+    j = WeightJournal(path, apply_fn, interval_secs=interval_secs)
+    _journals.append(j)
+    return j
+
+@atexit.register
+def _flush_all_at_exit() -> None:
+    for j in _journals:
+        try:
+            j.close()
+        except Exception as e:
+            logging.warning("[weight_journal] final flush failed: %s", e)